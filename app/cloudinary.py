@@ -1,51 +1,112 @@
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
 from app.config import settings
 
-# Configure Cloudinary if keys exist
-if all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret]):
-    cloudinary.config(
-        cloud_name=settings.cloudinary_cloud_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
+UPLOAD_FOLDER = "carezio/medical_records"
+
+_configured = False
+
+def configure_cloudinary():
+    """
+    Configure Cloudinary once if keys exist (called lazily before first use).
+    """
+    global _configured
+    if _configured:
+        return
+    if all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret]):
+        cloudinary.config(
+            cloud_name=settings.cloudinary_cloud_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret,
+            secure=True
+        )
+    _configured = True
 
 def upload_medical_file(file):
     """
-    Upload a file to Cloudinary and return its URL and type.
-    Returns a dummy URL if keys are missing (development fallback).
+    Upload a file to Cloudinary and return the upload result
+    (secure_url, public_id, format, bytes, ...).
+    Returns a dummy result if keys are missing (development fallback).
     """
     if not all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret]):
-        return "https://dummy.cloudinary.com/file.pdf", "pdf"
+        return {"secure_url": "https://dummy.cloudinary.com/file.pdf", "public_id": f"{UPLOAD_FOLDER}/file", "format": "pdf"}
 
-    result = cloudinary.uploader.upload(
+    configure_cloudinary()
+    return cloudinary.uploader.upload(
         file,
-        folder="carezio/medical_records",
+        folder=UPLOAD_FOLDER,
         resource_type="auto"
     )
 
-    return result.get("secure_url"), result.get("format", "unknown")
+
+def public_id_from_url(file_url):
+    """
+    Extract the public_id from a Cloudinary delivery URL.
+    Assumes URL structure: https://res.cloudinary.com/<cloud_name>/.../carezio/medical_records/<filename>.<ext>
+    """
+    filename_with_ext = file_url.split("/")[-1]
+    return f"{UPLOAD_FOLDER}/{filename_with_ext.rsplit('.', 1)[0]}"
 
 
-def delete_medical_file(file_url):
+def delete_medical_file(public_id):
     """
-    Delete a file from Cloudinary using its URL.
+    Delete a file from Cloudinary using its public_id.
     Returns True if deletion succeeded, False otherwise.
     """
     if not all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret]):
         # Nothing to delete in dev mode
         return True
 
+    configure_cloudinary()
     try:
-        # Extract public_id from URL
-        # Assumes URL structure: https://res.cloudinary.com/<cloud_name>/.../carezio/medical_records/<filename>.<ext>
-        parts = file_url.split("/")
-        filename_with_ext = parts[-1]
-        folder_path = "/".join(parts[-2:-1])  # "carezio/medical_records" or adjust if needed
-        public_id = f"carezio/medical_records/{filename_with_ext.split('.')[0]}"
-
-        cloudinary.uploader.destroy(public_id, resource_type="auto", type="authenticated")
-        return True
+        # JPG/PNG/PDF uploaded with resource_type="auto" are stored as "image" resources
+        result = cloudinary.uploader.destroy(public_id, resource_type="image", type="upload")
+        return result.get("result") in ("ok", "not found")
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+
+def delete_medical_files(public_ids):
+    """
+    Bulk-delete up to 100 files from Cloudinary with one Admin API call.
+    Returns {public_id: True/False}; files that no longer exist count as deleted.
+    Raises on API errors so the caller can retry the whole batch.
+    """
+    if not all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret]):
+        return {public_id: True for public_id in public_ids}
+
+    configure_cloudinary()
+    result = cloudinary.api.delete_resources(list(public_ids), resource_type="image", type="upload")
+    deleted = result.get("deleted", {})
+    return {
+        public_id: deleted.get(public_id) in ("deleted", "not_found")
+        for public_id in public_ids
+    }
+
+
+def medical_file_urls(public_id, file_type, expires_at, thumbnail_size, preview_width):
+    """
+    Build delivery URLs for a stored file without any network call:
+    signed thumbnail / preview transformations (first page for PDFs) and a
+    time-limited signed download URL for the original.
+    """
+    configure_cloudinary()
+    options = {"resource_type": "image", "type": "upload", "sign_url": True, "format": "jpg"}
+    if file_type == "pdf":
+        options["page"] = 1
+    thumbnail_url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        transformation=[{"width": thumbnail_size, "height": thumbnail_size, "crop": "fill", "quality": "auto"}],
+        **options
+    )
+    preview_url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        transformation=[{"width": preview_width, "crop": "limit", "quality": "auto"}],
+        **options
+    )
+    signed_url = cloudinary.utils.private_download_url(
+        public_id, file_type, resource_type="image", type="upload", expires_at=expires_at
+    )
+    return thumbnail_url, preview_url, signed_url
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 ENV_PATH = Path(__file__).parent.parent / ".env"
 
@@ -16,19 +16,95 @@ class Settings(BaseSettings):
     database_username: Optional[str] = None
     database_password: Optional[str] = None
     database_name: Optional[str] = None
+    database_replica_urls: List[str] = []  # read replicas (JSON list); reads stay on the primary if empty
+    replica_stickiness_seconds: int = 5  # after a write, the client's reads go to the primary for this long
 
     # Security
     secret_key: str = "dev-secret-change-me"
     algorithm: str = "HS256"
-    access_token_expire_minutes: int = 60 * 24 * 7  # 7 days
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 30
+    revocation_sync_seconds: int = 10  # how often workers pull new revocations
+    revocation_full_sync_seconds: int = 300  # full reload (drops expired entries)
+    revocation_bloom_capacity: int = 100000
+    revocation_bloom_error_rate: float = 0.001
 
     # Cloudinary
     cloudinary_cloud_name: Optional[str] = None
     cloudinary_api_key: Optional[str] = None
     cloudinary_api_secret: Optional[str] = None
 
+    # File storage for medical records
+    storage_backend: Optional[str] = None  # "cloudinary" or "local"; defaults to cloudinary when configured
+    local_storage_dir: str = str(Path(__file__).parent.parent / "media")
+    local_storage_url: str = "/media"
+    max_upload_bytes: int = 10 * 1024 * 1024  # 10 MB
+    upload_concurrency: int = 4  # concurrent uploads to the storage backend per process
+    signed_url_ttl_seconds: int = 3600  # lifetime of signed URLs for original files
+    thumbnail_size: int = 200  # px, square thumbnails for record lists
+    preview_width: int = 1024  # px, max width of preview images
+    file_deletion_interval_seconds: int = 30  # how often the deletion outbox is drained
+    file_deletion_batch_size: int = 100
+    file_deletion_max_attempts: int = 8  # after this many failures a file is reported as orphaned
+
     # Firebase (optional)
     firebase_credentials: Optional[str] = None
+    fcm_token_stale_days: int = 60  # tokens not re-registered for this long are pruned
+    fcm_token_prune_minutes: int = 60
+    push_rate_per_second: float = 200  # outbound push budget (token bucket; 0 = unlimited)
+    push_burst: int = 200
+    push_workers: int = 4  # concurrent sends per dispatcher
+    push_bulk_deadline_seconds: int = 3600  # inventory / system pushes queued longer are dropped
+    push_dispatch_interval_seconds: int = 5  # how often the push outbox is drained
+    push_batch_size: int = 200
+    push_max_attempts: int = 6  # failed pushes are retried with backoff, then parked
+    push_parked_retention_hours: int = 24  # parked pushes are kept this long for inspection, then purged
+
+    # Hospital / pharmacy directories
+    directory_data_dir: Optional[str] = None  # defaults to app/data
+    directory_reload_seconds: int = 30  # how often data files are checked for changes
+    directory_cache_max_age: int = 300  # Cache-Control max-age for directory responses
+
+    # Rate limiting (token buckets per user or client IP)
+    rate_limit_enabled: bool = True
+    rate_limit_per_second: float = 10  # default budget per user / IP
+    rate_limit_burst: int = 40
+    rate_limit_poll_per_second: float = 1  # GET /notifications*
+    rate_limit_poll_burst: int = 10
+    rate_limit_login_per_minute: int = 10  # login, signup, token refresh (per IP)
+    rate_limit_login_burst: int = 5
+    rate_limit_backend: str = "memory"  # "memory" (per process) or "database" (shared by all workers / replicas)
+    rate_limit_max_keys: int = 100000  # buckets kept in memory
+    rate_limit_trust_forwarded_for: bool = False  # use X-Forwarded-For behind a trusted proxy
+
+    # Reminders
+    reminder_batch_size: int = 1000  # due schedule times claimed per query
+    reminder_grace_seconds: int = 300  # reminders overdue by more than this (scheduler down) are skipped
+    reminder_resync_seconds: int = 300  # reminder loop reloads upcoming fire times from the table
+    reminder_heap_size: int = 10000  # distinct upcoming fire times loaded per resync
+    followup_offsets_minutes: List[int] = [15, 30]  # follow-ups after a reminder until the dose is logged; [] disables
+    followup_tick_seconds: int = 10  # follow-up job interval and timing wheel resolution
+    followup_intake_window_minutes: int = 60  # an intake this long before a slot (or any time after) answers it
+
+    # Per-user response cache (medicine / schedule lists)
+    response_cache_enabled: bool = True
+    response_cache_backend: str = "memory"  # "memory" (single worker) or "database" (versions shared by all workers)
+    response_cache_max_users: int = 10000  # users kept in the in-process LRU
+    response_cache_ttl_seconds: int = 600  # safety net; writes invalidate immediately
+
+    # Response compression (gzip; brotli when the module is installed)
+    compression_min_bytes: int = 1024  # smaller bodies are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_cache_entries: int = 1024  # compressed bodies kept per ETag and encoding
+
+    # Instrumentation
+    slow_query_ms: int = 200  # log SQL statements slower than this
+    slow_request_ms: int = 1000  # log requests slower than this
+    n_plus_one_query_threshold: int = 20  # log requests issuing more queries than this
+
+    # Startup
+    startup_import_budget_ms: int = 1500  # `python -m app.startup` fails above this
 
     model_config = SettingsConfigDict(env_file=ENV_PATH, extra="ignore")
 
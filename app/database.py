@@ -1,9 +1,26 @@
+import hashlib
+import hmac
+import itertools
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.datastructures import MutableHeaders
 from app.config import settings
 
 """
 Database connection and session setup using SQLAlchemy.
+
+`engine` is the primary. With `settings.database_replica_urls`, read-only
+requests (GET / HEAD) get sessions on the replicas (round robin) - except
+right after the client wrote: every successful write response carries a
+signed last-write marker (cookie and `X-Last-Write` header, see
+`ReadYourWritesMiddleware`), and requests presenting one younger than
+`settings.replica_stickiness_seconds` read from the primary, on any worker.
+Background scans use `ReplicaSession()` directly.
 """
 
 SQLALCHEMY_DATABASE_URL = settings.assembled_db_url
@@ -12,13 +29,89 @@ SQLALCHEMY_DATABASE_URL = settings.assembled_db_url
 engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in settings.database_replica_urls]
+_replica_cycle = itertools.cycle(replica_engines)
+_replica_lock = threading.Lock()
+
+READ_METHODS = ("GET", "HEAD")
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "x-last-write"
+
 Base = declarative_base()
 
-def get_db():
+
+def ReplicaSession() -> Session:
+    """
+    New session on the next read replica (the primary if none are configured).
+    Only for reads that tolerate replication lag.
+    """
+    if not replica_engines:
+        return SessionLocal()
+    with _replica_lock:
+        bind = next(_replica_cycle)
+    return SessionLocal(bind=bind)
+
+
+def _sign(timestamp: str) -> str:
+    return hmac.new(settings.secret_key.encode("utf-8"), timestamp.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def last_write_marker(now: float) -> str:
+    timestamp = str(int(now))
+    return f"{timestamp}.{_sign(timestamp)}"
+
+
+def wrote_recently(request: Request) -> bool:
+    """
+    True if the request carries a valid last-write marker inside the stickiness window.
+    """
+    marker = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    if not marker:
+        return False
+    timestamp, _, signature = marker.partition(".")
+    if not timestamp.isdigit() or not hmac.compare_digest(_sign(timestamp), signature):
+        return False
+    return time.time() - int(timestamp) <= settings.replica_stickiness_seconds
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware stamping successful write responses with a signed
+    last-write marker, so the client's next reads go to the primary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or not replica_engines:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # Stamped as the response starts, i.e. after the route committed
+                marker = last_write_marker(time.time())
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{LAST_WRITE_COOKIE}={marker}; Max-Age={settings.replica_stickiness_seconds}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                headers["X-Last-Write"] = marker
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def get_db(request: Request):
     """
-    Dependency to get a new database session.
+    Dependency to get a new database session (a replica session for reads, see module doc).
     """
-    db = SessionLocal()
+    if request.method in READ_METHODS and replica_engines and not wrote_recently(request):
+        db = ReplicaSession()
+    else:
+        db = SessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.config import settings
+from app.geo import GeoIndex
+from app.negotiation import MSGPACK_MEDIA_TYPE, accepts_msgpack, encode_msgpack
+from app.search import SearchIndex
+
+"""
+Static directories (hospitals, pharmacies) loaded from JSON data files.
+
+Each directory is held as an immutable snapshot (records, search index,
+spatial index, pre-serialized list body and ETag). The data file is re-checked at most every
+`settings.directory_reload_seconds`, so editing it takes effect without a
+restart. Responses carry ETag / Cache-Control headers and conditional
+requests with a matching If-None-Match get a 304. Clients sending
+`Accept: application/msgpack` get the same records as MessagePack.
+"""
+
+DATA_DIR = Path(settings.directory_data_dir) if settings.directory_data_dir else Path(__file__).parent / "data"
+
+
+def _dump(records, as_msgpack: bool = False) -> bytes:
+    """
+    Serialize records to compact JSON (or MessagePack) bytes.
+    """
+    if as_msgpack:
+        return encode_msgpack(records)
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class DirectorySnapshot:
+    """
+    Immutable view of one version of a directory data file.
+    """
+
+    __slots__ = ("records", "index", "geo", "body", "msgpack_body", "etag")
+
+    def __init__(self, records: Tuple[dict, ...], etag: str):
+        self.records = records
+        self.index = SearchIndex(records)  # precomputes lowercase fields once
+        self.geo = GeoIndex([
+            (idx, record["latitude"], record["longitude"])
+            for idx, record in enumerate(records)
+            if record.get("latitude") is not None and record.get("longitude") is not None
+        ])
+        self.body = _dump(records)
+        self.msgpack_body = _dump(records, as_msgpack=True)
+        self.etag = etag
+
+
+class Directory:
+    """
+    Hot-reloadable directory backed by a JSON file of records validated by `schema`.
+    """
+
+    def __init__(self, name: str, path: Path, schema: Type[BaseModel]):
+        self.name = name
+        self.path = path
+        self.schema = schema
+        self._snapshot: Optional[DirectorySnapshot] = None
+        self._file_stat: Optional[Tuple[float, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> DirectorySnapshot:
+        """
+        Read, validate and index the data file.
+        """
+        raw = self.path.read_bytes()
+        etag = hashlib.sha256(raw).hexdigest()[:16]
+        if self._snapshot is not None and self._snapshot.etag == etag:
+            return self._snapshot  # touched but unchanged
+        records = tuple(
+            self.schema.model_validate(item).model_dump(mode="json")
+            for item in json.loads(raw)
+        )
+        print(f"[Directory] Loaded {len(records)} {self.name} (etag {etag})")
+        return DirectorySnapshot(records, etag)
+
+    def reload(self, force: bool = False) -> DirectorySnapshot:
+        """
+        Reload the data file if it changed on disk (or unconditionally with `force`).
+        A failed reload keeps serving the previous snapshot.
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stat = os.stat(self.path)
+            file_stat = (stat.st_mtime, stat.st_size)
+            if self._snapshot is not None and not force and self._file_stat == file_stat:
+                return self._snapshot
+            try:
+                self._snapshot = self._load()
+                self._file_stat = file_stat
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                print(f"[Directory] Reload of {self.name} failed, keeping previous data: {e}")
+            return self._snapshot
+
+    def snapshot(self) -> DirectorySnapshot:
+        """
+        Current snapshot; loads on first use and re-checks the file periodically.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._checked_at >= settings.directory_reload_seconds:
+            try:
+                snapshot = self.reload()
+            except OSError as e:
+                if snapshot is None:
+                    raise
+                print(f"[Directory] Could not stat {self.path}: {e}")
+        return snapshot
+
+    def response(self, request: Request, query: Optional[str] = None, limit: Optional[int] = None) -> Response:
+        """
+        Build a cacheable JSON (or MessagePack) response for the full list or a search query.
+        """
+        snapshot = self.snapshot()
+        as_msgpack = accepts_msgpack(request.headers.get("accept"))
+        tag = snapshot.etag + ("-msgpack" if as_msgpack else "")
+        if query or limit:
+            variant = hashlib.sha1(f"{query or ''}\0{limit or ''}".encode("utf-8")).hexdigest()[:8]
+            etag = f'"{tag}-{variant}"'
+        else:
+            etag = f'"{tag}"'
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.directory_cache_max_age}",
+            "Vary": "Accept",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        if query:
+            body = _dump(snapshot.index.search(query, limit), as_msgpack)
+        elif limit:
+            body = _dump(snapshot.records[:limit], as_msgpack)
+        else:
+            body = snapshot.msgpack_body if as_msgpack else snapshot.body
+        media_type = MSGPACK_MEDIA_TYPE if as_msgpack else "application/json"
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def nearby(
+        self,
+        lat: float,
+        lon: float,
+        limit: int,
+        predicate: Optional[Callable[[dict], bool]] = None,
+    ) -> List[dict]:
+        """
+        Records closest to (lat, lon), nearest first, each with a `distance_km`.
+        Records without coordinates are never returned.
+        """
+        snapshot = self.snapshot()
+        records = snapshot.records
+        matches = snapshot.geo.nearest(
+            lat, lon, limit,
+            predicate=(lambda idx: predicate(records[idx])) if predicate else None,
+        )
+        return [{**records[idx], "distance_km": round(distance, 3)} for distance, idx in matches]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+"""
+FCM device token lifecycle.
+
+Apps register their token on every start (`register_token`, an atomic upsert
+on (user_id, fcm_token) that refreshes `last_seen_at`). Tokens FCM reports as
+unregistered (app uninstalled, token rotated) get `unregistered_at` set, which
+stops every worker from queueing pushes to them (`live_token`) unless the app
+registers the token again afterwards. `prune_fcm_tokens` - a scheduler job -
+deletes them together with tokens not seen for `settings.fcm_token_stale_days`.
+"""
+
+
+def live_token():
+    """
+    Filter for tokens that may receive pushes.
+    """
+    return or_(
+        models.UserFCMToken.unregistered_at.is_(None),
+        models.UserFCMToken.unregistered_at <= models.UserFCMToken.last_seen_at
+    )
+
+
+def register_token(db: Session, user_id: int, token: str) -> Tuple[int, bool]:
+    """
+    Insert the user's token or refresh its `last_seen_at`, and commit.
+    Returns (token id, True if it was newly registered).
+    """
+    insert_ = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+    row = db.execute(
+        insert_(models.UserFCMToken)
+        .values(user_id=user_id, fcm_token=token)
+        .on_conflict_do_update(
+            index_elements=["user_id", "fcm_token"],
+            set_={"last_seen_at": func.now()},
+        )
+        # Both default to now() on insert; a refresh only moves last_seen_at
+        .returning(models.UserFCMToken.id, models.UserFCMToken.created_at == models.UserFCMToken.last_seen_at)
+    ).one()
+    db.commit()
+    return row[0], row[1]
+
+
+def mark_unregistered(token: str):
+    """
+    Record that FCM rejected `token` as no longer registered.
+    """
+    db: Session = SessionLocal()
+    try:
+        db.execute(
+            update(models.UserFCMToken)
+            .where(models.UserFCMToken.fcm_token == token)
+            .values(unregistered_at=func.now())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def prune_fcm_tokens() -> int:
+    """
+    Delete unregistered and stale tokens. Returns the number of rows deleted.
+    A token registered again after FCM rejected it is kept.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.fcm_token_stale_days)
+    db: Session = SessionLocal()
+    try:
+        deleted = db.execute(
+            delete(models.UserFCMToken).where(or_(
+                models.UserFCMToken.last_seen_at < cutoff,
+                models.UserFCMToken.unregistered_at > models.UserFCMToken.last_seen_at
+            ))
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if deleted:
+        print(f"[FCM] Pruned {deleted} unregistered or stale tokens")
+    return deleted
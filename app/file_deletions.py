@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.storage import get_storage
+
+"""
+Background worker that drains the file deletion outbox.
+
+Deleting a medical record only inserts a FileDeletionOutbox row in the same
+transaction as the record delete, so the request never waits on the storage
+API. This worker claims due rows in batches (FOR UPDATE SKIP LOCKED, so
+several workers can run side by side), deletes the files through the
+backend's bulk API and retries failures with exponential backoff. Rows that
+fail `settings.file_deletion_max_attempts` times are parked (next_attempt_at
+is NULL) and reported as orphaned files.
+"""
+
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+
+def queue_file_deletion(db: Session, public_id: str):
+    """
+    Add a file to the deletion outbox. Committed together with the caller's transaction.
+    """
+    db.add(models.FileDeletionOutbox(public_id=public_id, backend=get_storage().name))
+
+
+def _backoff(attempts: int) -> timedelta:
+    """
+    Delay before the next retry after `attempts` failures.
+    """
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def process_file_deletions():
+    """
+    Delete one batch of due files from storage. Returns the number of files deleted.
+    """
+    storage = get_storage()
+    db: Session = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        rows = db.execute(
+            select(models.FileDeletionOutbox)
+            .where(
+                models.FileDeletionOutbox.backend == storage.name,
+                models.FileDeletionOutbox.next_attempt_at <= now
+            )
+            .order_by(models.FileDeletionOutbox.next_attempt_at)
+            .limit(settings.file_deletion_batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not rows:
+            return 0
+
+        try:
+            results = storage.delete_many([row.public_id for row in rows])
+            error = "Storage reported the file was not deleted"
+        except Exception as e:
+            results = {}
+            error = str(e)[:500]
+
+        deleted = 0
+        for row in rows:
+            if results.get(row.public_id):
+                db.delete(row)
+                deleted += 1
+                continue
+            row.attempts += 1
+            row.last_error = error
+            if row.attempts >= settings.file_deletion_max_attempts:
+                row.next_attempt_at = None  # give up: orphaned in storage
+            else:
+                row.next_attempt_at = now + _backoff(row.attempts)
+        db.commit()
+
+        failed = len(rows) - deleted
+        print(f"[FileDeletion] Deleted {deleted} file(s), {failed} failed")
+        if failed:
+            _report_orphans(db)
+        return deleted
+    except Exception as e:
+        print(f"[FileDeletion ERROR] {e}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+
+def _report_orphans(db: Session):
+    """
+    Log how many files were given up on, per backend.
+    """
+    counts = db.execute(
+        select(models.FileDeletionOutbox.backend, func.count())
+        .where(models.FileDeletionOutbox.next_attempt_at.is_(None))
+        .group_by(models.FileDeletionOutbox.backend)
+    ).all()
+    for backend, count in counts:
+        print(f"[FileDeletion] {count} orphaned file(s) in {backend} storage need manual cleanup")
@@ -1,57 +1,96 @@
 import json
-import firebase_admin
-from firebase_admin import credentials, messaging
+import threading
 from app.config import settings
-from app.models import UserFCMToken
-from sqlalchemy.orm import Session
+from app.fcm_tokens import mark_unregistered
 
 """
 Firebase integration for sending push notifications.
+
+The Firebase SDK is imported and initialized lazily (from the app lifespan or
+on the first push), so importing this module stays cheap and a broken
+credential never prevents the app from starting.
 """
 
 HAS_FIREBASE = False
 
-cred_data = settings.firebase_credentials
+# Optional replacement for FCM delivery (benchmarks, tests): callable(token, title, body) -> response
+_push_transport = None
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def init_firebase() -> bool:
+    """
+    Initialize the Firebase app once. Returns True if push notifications are available.
+    """
+    global HAS_FIREBASE, _initialized
+    if _initialized:
+        return HAS_FIREBASE
+    with _init_lock:
+        if _initialized:
+            return HAS_FIREBASE
+        _initialized = True
+
+        cred_data = settings.firebase_credentials
+        if not cred_data:
+            print("[Firebase] No firebase credentials provided — push notifications disabled.")
+            return HAS_FIREBASE
+
+        import firebase_admin
+        from firebase_admin import credentials
 
-if cred_data:
-    try:
-        cred_dict = json.loads(cred_data)
-
-        # 🔹 Fix: replace escaped '\n' with actual newlines in private_key
-        if "private_key" in cred_dict:
-            cred_dict["private_key"] = cred_dict["private_key"].replace("\\n", "\n")
-
-        cred = credentials.Certificate(cred_dict)
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred)
-        HAS_FIREBASE = True
-        print("[Firebase] Initialized successfully.")
-    except json.JSONDecodeError:
         try:
-            # Try loading from file path if JSON parsing fails
-            cred = credentials.Certificate(cred_data)
+            cred_dict = json.loads(cred_data)
+
+            # 🔹 Fix: replace escaped '\n' with actual newlines in private_key
+            if "private_key" in cred_dict:
+                cred_dict["private_key"] = cred_dict["private_key"].replace("\\n", "\n")
+
+            cred = credentials.Certificate(cred_dict)
             if not firebase_admin._apps:
                 firebase_admin.initialize_app(cred)
             HAS_FIREBASE = True
-            print("[Firebase] Initialized successfully (file path).")
+            print("[Firebase] Initialized successfully.")
+        except json.JSONDecodeError:
+            try:
+                # Try loading from file path if JSON parsing fails
+                cred = credentials.Certificate(cred_data)
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(cred)
+                HAS_FIREBASE = True
+                print("[Firebase] Initialized successfully (file path).")
+            except Exception as e:
+                print(f"[Firebase] Failed to initialize with provided credentials: {e}")
+                HAS_FIREBASE = False
         except Exception as e:
-            print(f"[Firebase] Failed to initialize with provided credentials: {e}")
+            print(f"[Firebase] Error initializing firebase: {e}")
             HAS_FIREBASE = False
-    except Exception as e:
-        print(f"[Firebase] Error initializing firebase: {e}")
-        HAS_FIREBASE = False
-else:
-    print("[Firebase] No firebase credentials provided — push notifications disabled.")
-    HAS_FIREBASE = False
+        return HAS_FIREBASE
+
+
+def set_push_transport(transport):
+    """
+    Route all pushes through `transport(token, title, body)` instead of FCM.
+    Pass None to restore FCM delivery.
+    """
+    global _push_transport
+    _push_transport = transport
 
 
 def send_push_notification(token: str, title: str, body: str):
     """
     Send a push notification with the given title and body to a single FCM token.
+    Tokens FCM reports as unregistered are marked so no more pushes are queued
+    to them; other delivery errors are raised so the push outbox can retry.
     """
-    if not HAS_FIREBASE:
+    if _push_transport is not None:
+        return _push_transport(token, title, body)
+    if not init_firebase():
         print(f"[Firebase] Skipping send (no config). Token start: {token[:10] if token else 'N/A'}... Title: {title}")
         return None
+    from firebase_admin import messaging
+
     try:
         message = messaging.Message(
             notification=messaging.Notification(title=title, body=body),
@@ -60,15 +99,10 @@ def send_push_notification(token: str, title: str, body: str):
         response = messaging.send(message)
         print(f"[Firebase] Notification sent. Response: {response}")
         return response
+    except (messaging.UnregisteredError, messaging.SenderIdMismatchError) as e:
+        print(f"[Firebase] Token no longer registered, dropping it: {e}")
+        mark_unregistered(token)
+        return None
     except Exception as e:
         print(f"[Firebase] Failed to send push: {e}")
-        return None
-
-
-def send_push_to_user(db: Session, user_id: int, title: str, body: str):
-    """
-    Send a push notification to all registered FCM tokens of a given user.
-    """
-    tokens = db.query(UserFCMToken.fcm_token).filter(UserFCMToken.user_id == user_id).all()
-    for (token,) in tokens:
-        send_push_notification(token, title, body)
+        raise
@@ -0,0 +1,211 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.fcm_tokens import live_token
+from app.push_dispatch import PRIORITY_REMINDER, dispatch_pushes, queue_push
+from app.timing_wheel import TimingWheel
+
+"""
+Follow-up reminders for doses that were not logged.
+
+When a reminder fires, one ReminderFollowUp row per configured offset
+(`settings.followup_offsets_minutes`, e.g. +15 and +30 minutes) is written
+in the reminder's transaction and a timer for it is put on an in-memory
+hierarchical timing wheel. Timers are checked every
+`settings.followup_tick_seconds` without touching the database; only
+follow-ups that actually come due are read. Logging an intake deletes the
+medicine's pending rows and cancels their timers in O(1).
+
+The table is the source of truth: every worker rebuilds its wheel from it
+on startup, and a follow-up is claimed by deleting its row, so it is sent
+once even if several workers hold a timer for it. An intake logged on
+another worker (or just before the reminder) is caught by re-checking the
+intake log when the follow-up fires.
+"""
+
+RETRY_DELAY_SECONDS = 30  # a failed claim is tried again this much later
+
+wheel = TimingWheel(time.time(), resolution=settings.followup_tick_seconds)  # ticks match the job interval
+
+
+def schedule_followups(db: Session, reminders: Iterable[Tuple[int, int, datetime]]):
+    """
+    Add follow-ups for (user id, medicine id, slot) reminders. Their rows
+    are committed with the caller's transaction; the timers are armed
+    immediately (a timer whose row never commits finds nothing to claim).
+    """
+    rows = [
+        {
+            "user_id": user_id,
+            "medicine_id": medicine_id,
+            "slot_at": slot_at,
+            "due_at": slot_at + timedelta(minutes=offset),
+            "step": step,
+        }
+        for user_id, medicine_id, slot_at in reminders
+        for step, offset in enumerate(settings.followup_offsets_minutes, start=1)
+    ]
+    if not rows:
+        return
+    created = db.execute(
+        insert(models.ReminderFollowUp).returning(models.ReminderFollowUp.id, models.ReminderFollowUp.due_at),
+        rows
+    ).all()
+    for followup_id, due_at in created:
+        wheel.schedule(followup_id, due_at.timestamp())
+
+
+def cancel_followups(db: Session, user_id: int, taken: Iterable[Tuple[int, datetime]]):
+    """
+    Cancel the pending follow-ups answered by logged intakes, given as
+    (medicine id, taken_at) pairs, and commit.
+    """
+    window = timedelta(minutes=settings.followup_intake_window_minutes)
+    latest = {}
+    for medicine_id, taken_at in taken:
+        latest[medicine_id] = max(taken_at, latest.get(medicine_id, taken_at))
+    if not latest or not settings.followup_offsets_minutes:
+        return
+    cancelled = []
+    for medicine_id, taken_at in latest.items():
+        cancelled += db.execute(
+            delete(models.ReminderFollowUp)
+            .where(
+                models.ReminderFollowUp.user_id == user_id,
+                models.ReminderFollowUp.medicine_id == medicine_id,
+                models.ReminderFollowUp.slot_at <= taken_at + window
+            )
+            .returning(models.ReminderFollowUp.id)
+        ).scalars().all()
+    db.commit()
+    for followup_id in cancelled:
+        wheel.cancel(followup_id)
+
+
+def load_followups():
+    """
+    Startup step: arm a timer for every pending follow-up.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(models.ReminderFollowUp.id, models.ReminderFollowUp.due_at)).all()
+    finally:
+        db.close()
+    for followup_id, due_at in rows:
+        wheel.schedule(followup_id, due_at.timestamp())
+    print(f"[FollowUp] {len(rows)} pending follow-up(s) loaded")
+
+
+def fire_due_followups(now: Optional[float] = None) -> int:
+    """
+    Scheduler job: send the follow-ups whose timers expired. Returns the number sent.
+    - `now`: override the current time (tests).
+    """
+    now = time.time() if now is None else now
+    expired = [followup_id for followup_id, _ in wheel.advance(now)]
+    if not expired:
+        return 0
+
+    db: Session = SessionLocal()
+    try:
+        # Claim: only the worker whose delete returns the row sends it
+        claimed = db.execute(
+            delete(models.ReminderFollowUp)
+            .where(models.ReminderFollowUp.id.in_(expired))
+            .returning(
+                models.ReminderFollowUp.user_id,
+                models.ReminderFollowUp.medicine_id,
+                models.ReminderFollowUp.slot_at,
+                models.ReminderFollowUp.due_at,
+                models.ReminderFollowUp.step,
+            )
+        ).all()
+        sent = _send_followups(db, claimed, datetime.fromtimestamp(now, timezone.utc))
+        db.commit()
+    except Exception as e:
+        print(f"[FollowUp ERROR] {e}")
+        db.rollback()
+        for followup_id in expired:  # the rows are still there; don't wait for a restart
+            wheel.schedule(followup_id, now + RETRY_DELAY_SECONDS)
+        return 0
+    finally:
+        db.close()
+    if sent:
+        dispatch_pushes()
+    return sent
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)  # SQLite
+
+
+def _send_followups(db: Session, claimed: List, now: datetime) -> int:
+    """
+    Record and queue follow-ups for claimed rows whose dose is still not logged.
+    """
+    grace = timedelta(seconds=settings.reminder_grace_seconds)
+    claimed = [row for row in claimed if now - _utc(row.due_at) <= grace]  # stale after downtime
+    if not claimed:
+        return 0
+    window = timedelta(minutes=settings.followup_intake_window_minutes)
+
+    pairs = {(row.user_id, row.medicine_id) for row in claimed}
+    last_taken = dict(
+        ((user_id, medicine_id), taken_at)
+        for user_id, medicine_id, taken_at in db.execute(
+            select(
+                models.MedicineIntakeLog.user_id,
+                models.MedicineIntakeLog.medicine_id,
+                func.max(models.MedicineIntakeLog.taken_at),
+            )
+            .where(tuple_(models.MedicineIntakeLog.user_id, models.MedicineIntakeLog.medicine_id).in_(pairs))
+            .group_by(models.MedicineIntakeLog.user_id, models.MedicineIntakeLog.medicine_id)
+        )
+    )
+    medicines = {
+        medicine.id: medicine
+        for medicine in db.execute(
+            select(models.Medicine.id, models.Medicine.name, models.Medicine.dosage)
+            .where(models.Medicine.id.in_({row.medicine_id for row in claimed}))
+        )
+    }
+    tokens = {}
+    for user_id, token in db.execute(
+        select(models.UserFCMToken.user_id, models.UserFCMToken.fcm_token)
+        .where(models.UserFCMToken.user_id.in_({row.user_id for row in claimed}), live_token())
+    ):
+        tokens.setdefault(user_id, []).append(token)
+
+    sent = 0
+    for row in claimed:
+        taken_at = last_taken.get((row.user_id, row.medicine_id))
+        medicine = medicines.get(row.medicine_id)
+        if medicine is None or (taken_at is not None and _utc(taken_at) >= _utc(row.slot_at) - window):
+            continue
+        if row.step == 1:
+            title = f"Reminder: take {medicine.name}"
+        else:
+            title = f"Missed dose? {medicine.name}"
+        message = f"You haven't logged {medicine.name} ({medicine.dosage or 'dose'}) yet."
+        notif = models.Notification(
+            user_id=row.user_id,
+            title=title,
+            message=message,
+            notification_type="reminder",
+            related_entity_type="medicine",
+            related_entity_id=row.medicine_id
+        )
+        db.add(notif)
+        for token in tokens.get(row.user_id, []):
+            # No subject: a missed-dose nudge is never folded into a "Time to take" push
+            queue_push(db, token, title, message, PRIORITY_REMINDER, notif)
+        sent += 1
+        print(f"[FollowUp] Follow-up {row.step} for user {row.user_id} - medicine {medicine.name}")
+    return sent
@@ -0,0 +1,93 @@
+import heapq
+import math
+from typing import Callable, List, Optional, Sequence, Tuple
+
+"""
+Nearest-neighbour lookup over latitude/longitude points.
+
+Points are projected onto the unit sphere (x, y, z) and stored in a k-d tree.
+Straight-line (chord) distance between unit vectors grows monotonically with
+great-circle distance, so nearest neighbours in 3D are exactly the nearest
+on the globe, and the chord converts back to kilometres at the end.
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _to_xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    """
+    Convert degrees latitude/longitude to a unit vector.
+    """
+    phi, lam = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def _chord_to_km(chord_sq: float) -> float:
+    """
+    Convert a squared chord length on the unit sphere to great-circle kilometres.
+    """
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2))
+
+
+class GeoIndex:
+    """
+    Static k-d tree over (lat, lon) points, each tagged with an integer id
+    (e.g. the position of the record in its directory).
+    """
+
+    def __init__(self, points: Sequence[Tuple[int, float, float]]):
+        items = [(_to_xyz(lat, lon), ident) for ident, lat, lon in points]
+        self.size = len(items)
+        # Node layout: (xyz, id, axis, left, right)
+        self.root = self._build(items, 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        return (
+            items[mid][0],
+            items[mid][1],
+            axis,
+            self._build(items[:mid], depth + 1),
+            self._build(items[mid + 1:], depth + 1),
+        )
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        predicate: Optional[Callable[[int], bool]] = None,
+    ) -> List[Tuple[float, int]]:
+        """
+        Return up to `k` (distance_km, id) pairs closest to (lat, lon), nearest first.
+        Points whose id fails `predicate` are skipped.
+        """
+        if k <= 0 or self.root is None:
+            return []
+        target = _to_xyz(lat, lon)
+        best: List[Tuple[float, int]] = []  # max-heap of (-dist_sq, id)
+
+        def visit(node):
+            if node is None:
+                return
+            xyz, ident, axis, left, right = node
+            if predicate is None or predicate(ident):
+                dist_sq = (xyz[0] - target[0]) ** 2 + (xyz[1] - target[1]) ** 2 + (xyz[2] - target[2]) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-dist_sq, ident))
+                elif dist_sq < -best[0][0]:
+                    heapq.heapreplace(best, (-dist_sq, ident))
+            diff = target[axis] - xyz[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            # Only cross the splitting plane if it is closer than the current k-th best
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far)
+
+        visit(self.root)
+        return sorted((_chord_to_km(-neg_dist_sq), ident) for neg_dist_sq, ident in best)
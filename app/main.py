@@ -1,24 +1,61 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 
-from app.database import engine
+from app.config import settings
+from app.database import ReadYourWritesMiddleware, engine, replica_engines
+from app.firebase import init_firebase
+from app.followups import load_followups
+from app.metrics import MetricsMiddleware, install_query_hooks, render_prometheus
 from app.models import Base
-from app.routers import auth, users, hospitals, medicines, intakes, schedules, notifications, pharmacies, medical_records
+from app.negotiation import NegotiationMiddleware
+from app.rate_limit import RateLimitMiddleware
+from app.revocation import sync_revocations
+from app.routers import auth, users, hospitals, medicines, intakes, schedules, notifications, pharmacies, medical_records, dashboard
 from app.scheduler import start_scheduler
+from app.startup import StartupProfile
+from app.storage import get_storage, LocalStorage
+
+
+startup_profile = StartupProfile()
+
+
+def create_tables():
+    """
+    Create tables (dev only). In production use alembic.
+    """
+    Base.metadata.create_all(bind=engine)
+
 
+def init_storage():
+    """
+    Resolve the storage backend and configure its client.
+    """
+    if get_storage().name == "cloudinary":
+        from app.cloudinary import configure_cloudinary
+        configure_cloudinary()
 
-# create tables (dev only). In production use alembic
-Base.metadata.create_all(bind=engine)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Context manager for application startup/shutdown events.
+    Independent clients are initialized in parallel; failures are reported, not fatal.
     """
-    start_scheduler()
-    print("[App] Scheduler started")
+    await startup_profile.run_parallel({
+        "database tables": create_tables,
+        "firebase": init_firebase,
+        "storage": init_storage,
+    })
+    startup_profile.run("token revocations", sync_revocations)
+    startup_profile.run("follow-up reminders", load_followups)
+    startup_profile.run("scheduler", start_scheduler)
+    print(startup_profile.report())
     yield
     print("[App] App shutting down")
 
@@ -29,14 +66,29 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# signed last-write marker on write responses (read-your-writes with replicas)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# token-bucket rate limits; inside CORS so 429s carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Last-Write"],
 )
 
+# gzip / brotli compression and the MessagePack preference (Accept)
+app.add_middleware(NegotiationMiddleware)
+
+# per-route latency / status / query-count metrics (outermost middleware)
+app.add_middleware(MetricsMiddleware)
+for _engine in [engine, *replica_engines]:
+    install_query_hooks(_engine)
+
 # include routers
 app.include_router(users.router)
 app.include_router(auth.router)
@@ -47,6 +99,29 @@ app.include_router(schedules.router)
 app.include_router(notifications.router)
 app.include_router(pharmacies.router)
 app.include_router(medical_records.router)
+app.include_router(dashboard.router)
+
+# serve locally stored uploads via signed URLs (dev / tests only)
+_storage = get_storage()
+if isinstance(_storage, LocalStorage):
+    @app.get(_storage.base_url + "/{public_id:path}", include_in_schema=False)
+    def local_media(public_id: str, expires: int = 0, signature: str = ""):
+        """
+        Serve a locally stored file if its signed URL is valid and unexpired.
+        """
+        path = (_storage.root / public_id).resolve()
+        if (
+            not _storage.verify(public_id, expires, signature)
+            or _storage.root.resolve() not in path.parents
+            or not path.is_file()
+        ):
+            raise HTTPException(status_code=404, detail="File not found")
+        return FileResponse(path)
+
+
+startup_profile.record("import app.main", time.perf_counter() - _import_started)
+if time.perf_counter() - _import_started > settings.startup_import_budget_ms / 1000:
+    print(f"[Startup] Import of app.main exceeded {settings.startup_import_budget_ms} ms budget (run `python -m app.startup`)")
 
 
 @app.get("/")
@@ -67,6 +142,13 @@ def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Request latency, status and query-count metrics in Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus())
+
 @app.get("/info")
 def api_info():
     """
@@ -0,0 +1,174 @@
+import bisect
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+"""
+Request-level latency instrumentation.
+
+- `MetricsMiddleware` (plain ASGI) records per-route latency histograms,
+  status counts, query counts and an in-flight gauge.
+- `install_query_hooks(engine)` attaches SQLAlchemy cursor events that count
+  the queries issued for the current request (through a context variable,
+  which also reaches sync endpoints running in the threadpool) and log any
+  statement slower than `settings.slow_query_ms`.
+- Requests slower than `settings.slow_request_ms`, or issuing more than
+  `settings.n_plus_one_query_threshold` queries (a likely N+1), are logged.
+
+`render_prometheus()` exposes everything in Prometheus text format.
+"""
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class RequestStats:
+    """Per-request counters filled in by the query hooks."""
+    __slots__ = ("queries", "query_ms")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class RouteStats:
+    """Aggregated metrics for one (method, route) pair."""
+    __slots__ = ("buckets", "count", "total_ms", "statuses", "queries")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.statuses: Counter = Counter()
+        self.queries = 0
+
+
+class MetricsRegistry:
+    """In-process metrics store (updated from the event loop only)."""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = defaultdict(RouteStats)
+        self.in_flight = 0
+        self.slow_queries = 0
+
+    def observe(self, method: str, route: str, status: int, duration_ms: float, queries: int):
+        stats = self.routes[(method, route)]
+        stats.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        stats.count += 1
+        stats.total_ms += duration_ms
+        stats.statuses[status] += 1
+        stats.queries += queries
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            registry.in_flight -= 1
+            _current_request.reset(token)
+
+            # Route template (e.g. /intakes/{intake_id}) is set on the scope by the router
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            registry.observe(method, path, status_code, duration_ms, stats.queries)
+
+            if duration_ms > settings.slow_request_ms:
+                print(f"[Metrics] Slow request {method} {path}: {duration_ms:.0f} ms "
+                      f"({stats.queries} queries, {stats.query_ms:.0f} ms in DB)")
+            if stats.queries > settings.n_plus_one_query_threshold:
+                print(f"[Metrics] Possible N+1: {method} {path} issued {stats.queries} queries")
+
+
+def install_query_hooks(engine: Engine):
+    """
+    Count queries per request and log slow statements on `engine`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_ms += elapsed_ms
+        if elapsed_ms > settings.slow_query_ms:
+            registry.slow_queries += 1
+            print(f"[Metrics] Slow query ({elapsed_ms:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def render_prometheus() -> str:
+    """
+    Render all metrics in Prometheus text exposition format.
+    """
+    lines = [
+        "# TYPE carezio_http_request_duration_ms histogram",
+    ]
+    for (method, route), stats in sorted(registry.routes.items()):
+        labels = f'method="{method}",route="{route}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, stats.buckets):
+            cumulative += count
+            lines.append(f'carezio_http_request_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'carezio_http_request_duration_ms_bucket{{{labels},le="+Inf"}} {stats.count}')
+        lines.append(f"carezio_http_request_duration_ms_sum{{{labels}}} {stats.total_ms:.3f}")
+        lines.append(f"carezio_http_request_duration_ms_count{{{labels}}} {stats.count}")
+
+    lines.append("# TYPE carezio_http_responses_total counter")
+    for (method, route), stats in sorted(registry.routes.items()):
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f'carezio_http_responses_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+    lines.append("# TYPE carezio_db_queries_total counter")
+    for (method, route), stats in sorted(registry.routes.items()):
+        lines.append(f'carezio_db_queries_total{{method="{method}",route="{route}"}} {stats.queries}')
+
+    lines.append("# TYPE carezio_http_requests_in_flight gauge")
+    lines.append(f"carezio_http_requests_in_flight {registry.in_flight}")
+    lines.append("# TYPE carezio_db_slow_queries_total counter")
+    lines.append(f"carezio_db_slow_queries_total {registry.slow_queries}")
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, TIMESTAMP, text,
-    ForeignKey, DateTime, Time, func
+    Column, Integer, String, Boolean, Float, TIMESTAMP, text,
+    ForeignKey, DateTime, Time, func, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -16,6 +16,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     is_active = Column(Boolean, server_default=text("true"), nullable=False)
+    timezone = Column(String, server_default=text("'Asia/Kathmandu'"), nullable=False)  # IANA name; schedule times are in this zone
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -31,11 +32,17 @@ class User(Base):
 class UserFCMToken(Base):
     """Stores FCM tokens linked to users. Supports multiple tokens per user."""
     __tablename__ = "user_fcm_tokens"
+    __table_args__ = (
+        # Registration is an upsert on (user, token); the same token can still belong to several users
+        UniqueConstraint("user_id", "fcm_token", name="uq_user_fcm_token"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    fcm_token = Column(String, index=True)  # not unique → same token can belong to multiple users
+    fcm_token = Column(String, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    unregistered_at = Column(DateTime(timezone=True), nullable=True)  # FCM rejected it; void unless seen again after
 
     user = relationship("User", back_populates="fcm_tokens")
 
@@ -81,7 +88,8 @@ class ScheduleTime(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     schedule_id = Column(Integer, ForeignKey("medicine_schedules.id", ondelete="CASCADE"), index=True)
-    time_of_day = Column(Time, nullable=False)  # e.g., 08:00, 14:00, 20:00
+    time_of_day = Column(Time, nullable=False)  # e.g., 08:00, 14:00, 20:00 (user's local time)
+    next_fire_at = Column(DateTime(timezone=True), nullable=True, index=True)  # next UTC instant of time_of_day
 
     schedule = relationship("MedicineSchedule", back_populates="times")
 
@@ -91,11 +99,18 @@ class ScheduleTime(Base):
 
 class MedicineIntakeLog(Base):
     __tablename__ = "medicine_intake_logs"
+    __table_args__ = (
+        # Offline replays are idempotent per client-generated UUID
+        UniqueConstraint("user_id", "client_uuid", name="uq_intake_user_client_uuid"),
+        # Intake history is always read per user in taken_at order / ranges
+        Index("ix_intake_user_taken_at", "user_id", "taken_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     medicine_id = Column(Integer, ForeignKey("medicines.id", ondelete="CASCADE"), index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     taken_at = Column(DateTime(timezone=True), server_default=func.now())
+    client_uuid = Column(String, nullable=True)  # set by mobile app for offline-queued intakes
 
     user = relationship("User", back_populates="intakes")
     medicine = relationship("Medicine", back_populates="intakes")
@@ -119,6 +134,11 @@ class Notification(Base):
 
     user = relationship("User", back_populates="notifications")
 
+    __table_args__ = (
+        # Unread lists (newest first) and per-user stats
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Notification id={self.id} type={self.notification_type}>"
 
@@ -130,6 +150,107 @@ class MedicalRecord(Base):
     title = Column(String, nullable=False)
     file_url = Column(String, nullable=False)
     file_type = Column(String)
+    public_id = Column(String, nullable=True)  # storage backend id (null for legacy rows)
+    size_bytes = Column(Integer, nullable=True)
+    width = Column(Integer, nullable=True)  # pixels, for images (first page for PDFs on Cloudinary)
+    height = Column(Integer, nullable=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", backref="medical_records")
+
+
+class TokenRevocation(Base):
+    """Revoked tokens, login sessions and accounts (see app/revocation.py)."""
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, nullable=False)  # 'jti:<token id>', 'sid:<session id>' or 'user:<user id>'
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # after this no token it covers is valid
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<TokenRevocation key={self.key}>"
+
+
+class FileDeletionOutbox(Base):
+    """Storage files waiting to be deleted by the background worker."""
+    __tablename__ = "file_deletion_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    public_id = Column(String, nullable=False)
+    backend = Column(String, nullable=False)  # storage backend name, e.g. 'cloudinary'
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # null once given up
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<FileDeletionOutbox id={self.id} public_id={self.public_id} attempts={self.attempts}>"
+
+
+class PushOutbox(Base):
+    """Push notifications waiting to be sent by the dispatcher, one row per device token."""
+    __tablename__ = "push_outbox"
+    __table_args__ = (
+        # Dispatcher claims due rows, highest-priority lane first
+        Index("ix_push_outbox_priority_due", "priority", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), nullable=True, index=True)
+    token = Column(String, nullable=False, index=True)  # a batch claims all due reminders of its tokens
+    title = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    subject = Column(String, nullable=True)  # the medicine name of a reminder; rows without one are never coalesced
+    priority = Column(Integer, nullable=False)  # 0 reminder, 1 inventory, 2 system
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())  # null once given up
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    notification = relationship("Notification")
+
+    def __repr__(self):
+        return f"<PushOutbox id={self.id} priority={self.priority} attempts={self.attempts}>"
+
+
+class ResponseCacheVersion(Base):
+    """Per-user response cache version shared by all workers (response_cache_backend = "database")."""
+    __tablename__ = "response_cache_versions"
+
+    user_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<ResponseCacheVersion user_id={self.user_id} version={self.version}>"
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by all workers (rate_limit_backend = "database")."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)  # '<rule>:user:<id>', '<rule>:ip:<address>', 'push', ...
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # unix time of the last refill
+
+    def __repr__(self):
+        return f"<RateLimitBucket key={self.key} tokens={self.tokens}>"
+
+
+class ReminderFollowUp(Base):
+    """Pending follow-up reminder for a dose slot, until an intake is logged or it fires."""
+    __tablename__ = "reminder_followups"
+    __table_args__ = (
+        # Logging an intake cancels the medicine's pending follow-ups
+        Index("ix_reminder_followups_user_medicine", "user_id", "medicine_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    medicine_id = Column(Integer, ForeignKey("medicines.id", ondelete="CASCADE"), nullable=False)
+    slot_at = Column(DateTime(timezone=True), nullable=False)  # the reminder's scheduled instant
+    due_at = Column(DateTime(timezone=True), nullable=False)
+    step = Column(Integer, nullable=False)  # 1 for the first follow-up, 2 for the next, ...
+
+    def __repr__(self):
+        return f"<ReminderFollowUp id={self.id} medicine_id={self.medicine_id} step={self.step}>"
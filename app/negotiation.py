@@ -0,0 +1,187 @@
+import gzip
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+import msgpack
+from cachetools import LRUCache
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # listed in requirements.txt; gzip only if it is missing
+    brotli = None
+
+"""
+Content negotiation for mobile clients.
+
+- `NegotiationMiddleware` compresses JSON / text / MessagePack responses of
+  at least `settings.compression_min_bytes` with brotli or gzip, as allowed
+  by Accept-Encoding. Responses carrying an ETag (cached lists, directories)
+  are compressed once per ETag and encoding.
+- Endpoints opt into MessagePack through `Accept: application/msgpack`:
+  routes using `NegotiatedResponse` encode their (validated) content as
+  MessagePack instead of JSON, and pre-serialized responses check
+  `accepts_msgpack()` themselves.
+"""
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+_COMPRESSIBLE_TYPES = ("application/json", "text/", MSGPACK_MEDIA_TYPE)
+
+_msgpack_requested: ContextVar[bool] = ContextVar("msgpack_requested", default=False)
+
+_compressed_cache: LRUCache = LRUCache(maxsize=settings.compression_cache_entries)
+_compressed_cache_lock = threading.Lock()
+
+
+def _parse_qualities(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parse an Accept / Accept-Encoding header into {value: q}.
+    """
+    qualities = {}
+    for part in (header or "").split(","):
+        value, _, params = part.strip().partition(";")
+        if not value:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        qualities[value.strip().lower()] = q
+    return qualities
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    qualities = _parse_qualities(accept)
+    return any(qualities.get(media_type, 0) > 0 for media_type in _MSGPACK_TYPES)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Best supported content coding ("br" or "gzip") for an Accept-Encoding header.
+    """
+    qualities = _parse_qualities(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = qualities.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level)
+
+
+def encode_msgpack(content) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    JSON response that is encoded as MessagePack when the client asked for it.
+    """
+
+    def __init__(self, content, *args, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content) -> bytes:
+        if _msgpack_requested.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return encode_msgpack(content)
+        return super().render(content)
+
+
+def _compressible(start: dict) -> bool:
+    if start["status"] < 200 or start["status"] in (204, 206, 304):
+        return False
+    headers = Headers(raw=start["headers"])
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class NegotiationMiddleware:
+    """ASGI middleware: response compression and the MessagePack preference."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        coding = choose_encoding(request_headers.get("accept-encoding"))
+        token = _msgpack_requested.set(accepts_msgpack(request_headers.get("accept")))
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if not _compressible(message):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message  # hold until the body is known
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            passthrough = True
+            if message.get("more_body", False) or coding is None or len(body) < settings.compression_min_bytes:
+                # Streaming, not accepted or too small to be worth it
+                await send(start)
+                await send(message)
+                return
+
+            body = _compress_cached(body, coding, headers.get("etag"))
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed representation is not byte-identical
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _msgpack_requested.reset(token)
+
+
+def _compress_cached(body: bytes, coding: str, etag: Optional[str]) -> bytes:
+    """
+    Compress `body`, reusing the result for responses with the same ETag.
+    """
+    if not etag:
+        return compress(body, coding)
+    key: Tuple[str, str, int] = (etag, coding, len(body))
+    with _compressed_cache_lock:
+        cached = _compressed_cache.get(key)
+    if cached is None:
+        cached = compress(body, coding)
+        with _compressed_cache_lock:
+            _compressed_cache[key] = cached
+    return cached
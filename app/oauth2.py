@@ -1,4 +1,6 @@
+import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -7,6 +9,14 @@ from sqlalchemy.orm import Session
 from app.config import settings
 from app import models, schemas
 from app.database import get_db
+from app.revocation import revocations
+
+"""
+Tokens are short-lived access JWTs plus single-use refresh JWTs, both
+carrying a token id (`jti`) and a login session id (`sid`). Verification is
+stateless: signature, expiry and the in-memory revocation denylist
+(app/revocation.py), which covers logout and disabled accounts.
+"""
 
 # Token URL used by OAuth2PasswordBearer for Swagger UI
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -14,32 +24,97 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
 
-def create_access_token(data: dict) -> str:
+def create_access_token(data: dict, session_id: Optional[str] = None) -> str:
     """
     Create a JWT access token with expiration from provided data.
     """
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": int(expire.timestamp())})
+    to_encode.update({"exp": int(expire.timestamp()), "jti": uuid.uuid4().hex, "type": "access"})
+    if session_id:
+        to_encode["sid"] = session_id
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_access_token(token: str, credentials_exception: HTTPException) -> schemas.TokenData:
+def create_refresh_token(user_id: int, session_id: str) -> str:
     """
-    Verify JWT token and return token data if valid.
+    Create a single-use refresh token for a login session.
+    """
+    expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {
+        "user_id": user_id,
+        "exp": int(expire.timestamp()),
+        "jti": uuid.uuid4().hex,
+        "sid": session_id,
+        "type": "refresh",
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_token_pair(user_id: int, session_id: Optional[str] = None) -> dict:
+    """
+    Access and refresh tokens for a (new or continuing) login session, shaped as `schemas.Token`.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    return {
+        "access_token": create_access_token({"user_id": user_id}, session_id),
+        "refresh_token": create_refresh_token(user_id, session_id),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def decode_token(
+    token: str,
+    credentials_exception: HTTPException,
+    token_type: str = "access",
+    check_revocation: bool = True
+) -> dict:
+    """
+    Verify a JWT's signature, expiry, type and revocation; return its claims.
+    Tokens issued before token types existed count as access tokens.
     """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(id=int(user_id))
-        return token_data
     except JWTError as e:
         # Optional: log minimal error for debugging (do NOT print token)
         print(f"[Auth] JWT verification failed: {e}")
         raise credentials_exception
+    if payload.get("user_id") is None or payload.get("type", "access") != token_type:
+        raise credentials_exception
+    keys = [f"user:{payload['user_id']}"]
+    if payload.get("jti"):
+        keys.append(f"jti:{payload['jti']}")
+    if payload.get("sid"):
+        keys.append(f"sid:{payload['sid']}")
+    if check_revocation and revocations.is_revoked(*keys):
+        raise credentials_exception
+    return payload
+
+def token_user_id(scope) -> Optional[str]:
+    """
+    User id from a validly signed bearer token (expiry and revocation are left to the route).
+    """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM],
+                                    options={"verify_exp": False})
+            except JWTError:
+                return None
+            user_id = claims.get("user_id")
+            return str(user_id) if user_id is not None else None
+    return None
+
+def verify_access_token(token: str, credentials_exception: HTTPException) -> schemas.TokenData:
+    """
+    Verify JWT token and return token data if valid.
+    """
+    payload = decode_token(token, credentials_exception)
+    return schemas.TokenData(id=int(payload["user_id"]))
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
     """
@@ -52,6 +127,30 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
     token_data = verify_access_token(token, credentials_exception)
     user = db.query(models.User).filter(models.User.id == token_data.id).first()
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
+
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """
+    Dependency returning the user id from the JWT without loading the user.
+    For endpoints that only read rows owned by that id (e.g. cached list
+    endpoints), where a deleted account simply yields no rows.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    return verify_access_token(token, credentials_exception).id
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Dependency returning the verified claims of the current access token.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    return decode_token(token, credentials_exception)
@@ -0,0 +1,305 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.fcm_tokens import live_token
+from app.firebase import send_push_notification
+from app.rate_limit import get_rate_limit_backend
+
+"""
+Durable outbound push delivery: a transactional outbox with priority lanes
+and rate shaping.
+
+Code that creates a notification queues its pushes with `queue_push` /
+`queue_push_to_user` - PushOutbox rows, one per device token - in the same
+transaction, so a push is never lost between commit and send. The
+dispatcher (`dispatch_pushes`, a scheduler job that the reminder tick also
+runs directly) claims due rows in batches with FOR UPDATE SKIP LOCKED, so
+several processes can dispatch side by side without double sends:
+
+- lanes: dose reminders first, then inventory alerts, then system / doctor
+  messages (rows are claimed by priority), so reminders never wait behind
+  bulk traffic for more than one batch;
+- coalescing: reminders for the same device token go out as one push ("Time
+  to take A, B and C") - a batch also claims every other due reminder row of
+  the tokens it holds, so a device's reminders are never split over batches;
+- shaping: a batch takes one token per send from the "push" bucket of the
+  rate limit backend (`settings.push_rate_per_second`, `settings.push_burst`)
+  before sending, so peaks like 08:00 are spread out at the provider quota -
+  across all dispatchers with `settings.rate_limit_backend = "database"`.
+  Batches are capped at the burst size, and a dispatcher waiting for budget
+  releases its claimed rows first, so no one sleeps holding row locks;
+- deadlines: a push still unsent when its lane's deadline passes is dropped;
+- retries: failed sends are retried with exponential backoff and parked
+  (next_attempt_at NULL) after `settings.push_max_attempts`; parked rows are
+  reported and purged after `settings.push_parked_retention_hours`
+  (`purge_parked_pushes`, a scheduler job).
+"""
+
+PRIORITY_REMINDER = 0
+PRIORITY_INVENTORY = 1
+PRIORITY_SYSTEM = 2
+
+LANES = {"reminder": PRIORITY_REMINDER, "inventory": PRIORITY_INVENTORY}  # anything else: system
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 10 * 60
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def queue_push(
+    db: Session,
+    token: str,
+    title: str,
+    body: str,
+    priority: int = PRIORITY_SYSTEM,
+    notification: Optional[models.Notification] = None,
+    subject: Optional[str] = None,
+):
+    """
+    Queue a push to one FCM token. Committed together with the caller's transaction.
+    - `subject`: what a coalesced push lists (e.g. the medicine name). Only
+      reminder-lane rows with a subject are coalesced; others (follow-ups)
+      are sent with their own title and body.
+    """
+    db.add(models.PushOutbox(
+        notification=notification,
+        token=token,
+        title=title,
+        body=body,
+        subject=subject,
+        priority=priority,
+    ))
+
+
+def queue_push_to_user(
+    db: Session,
+    user_id: int,
+    title: str,
+    body: str,
+    priority: int = PRIORITY_SYSTEM,
+    notification: Optional[models.Notification] = None,
+):
+    """
+    Queue a push to all registered FCM tokens of a given user.
+    """
+    tokens = db.execute(
+        select(models.UserFCMToken.fcm_token).where(models.UserFCMToken.user_id == user_id, live_token())
+    ).scalars()
+    for token in tokens:
+        queue_push(db, token, title, body, priority, notification)
+
+
+def _deadline(priority: int) -> timedelta:
+    if priority == PRIORITY_REMINDER:
+        return timedelta(seconds=settings.reminder_grace_seconds)  # a late reminder is as stale as a missed one
+    return timedelta(seconds=settings.push_bulk_deadline_seconds)
+
+
+def _backoff(attempts: int) -> timedelta:
+    """
+    Delay before the next retry after `attempts` failures.
+    """
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _coalescable(row: models.PushOutbox) -> bool:
+    return row.priority == PRIORITY_REMINDER and row.subject is not None
+
+
+def _combined(rows: List[models.PushOutbox]) -> Tuple[str, str]:
+    """
+    (title, body) of one push covering `rows`.
+    """
+    if len(rows) == 1:
+        return rows[0].title, rows[0].body
+    names = list(dict.fromkeys(row.subject for row in rows))
+    if len(names) == 1:
+        listed = names[0]
+    else:
+        listed = ", ".join(names[:-1]) + f" and {names[-1]}"
+    return "Time to take your medicines", f"Time to take {listed}."
+
+
+def _batch_limit() -> int:
+    """
+    Rows claimed per batch; never more than one burst, so a batch's sends can always be paid for.
+    """
+    if settings.push_rate_per_second > 0:
+        return max(1, min(settings.push_batch_size, settings.push_burst))
+    return settings.push_batch_size
+
+
+def _take_push_tokens(count: int) -> float:
+    """
+    Take `count` tokens of the outbound push budget; returns the seconds to wait if there aren't enough.
+    """
+    if settings.push_rate_per_second <= 0 or not count:
+        return 0.0
+    return get_rate_limit_backend().take("push", settings.push_rate_per_second, settings.push_burst, count)
+
+
+def _send(token: str, title: str, body: str) -> Optional[str]:
+    """
+    Send one push (its rate limit token is already taken). Returns an error message on failure.
+    """
+    try:
+        send_push_notification(token, title, body)
+    except Exception as e:
+        return str(e)[:500] or type(e).__name__
+    return None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.push_workers, thread_name_prefix="push")
+    return _executor
+
+
+def _claim_sibling_reminders(db: Session, now: datetime, rows: List[models.PushOutbox]) -> List[models.PushOutbox]:
+    """
+    Claim the due reminder rows for the batch's reminder tokens that the batch
+    itself didn't get (they sit further down the id order), so they are coalesced now.
+    """
+    tokens = {row.token for row in rows if _coalescable(row)}
+    if not tokens:
+        return []
+    return db.execute(
+        select(models.PushOutbox)
+        .where(
+            models.PushOutbox.priority == PRIORITY_REMINDER,
+            models.PushOutbox.subject.isnot(None),
+            models.PushOutbox.next_attempt_at <= now,
+            models.PushOutbox.token.in_(tokens),
+            models.PushOutbox.id.notin_([row.id for row in rows])
+        )
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+def _dispatch_batch(db: Session, now: datetime) -> int:
+    """
+    Claim and send one batch of due pushes. Returns the number of rows claimed.
+    """
+    while True:
+        rows = db.execute(
+            select(models.PushOutbox)
+            .where(models.PushOutbox.next_attempt_at <= now)
+            .order_by(models.PushOutbox.priority, models.PushOutbox.id)
+            .limit(_batch_limit())
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not rows:
+            return 0
+        rows += _claim_sibling_reminders(db, now, rows)
+
+        groups: Dict[tuple, List[models.PushOutbox]] = {}
+        expired = 0
+        for row in rows:
+            created_at = row.created_at if row.created_at.tzinfo else row.created_at.replace(tzinfo=timezone.utc)  # SQLite
+            if now - created_at > _deadline(row.priority):
+                db.delete(row)
+                expired += 1
+            elif _coalescable(row):
+                groups.setdefault((row.token, "reminders"), []).append(row)
+            else:
+                groups[(row.token, row.id)] = [row]
+
+        wait = _take_push_tokens(len(groups))
+        if not wait:
+            break
+        db.rollback()  # let other dispatchers have the rows while we wait for budget
+        time.sleep(min(wait, 1.0))
+        now = datetime.now(timezone.utc)
+
+    pushes = [(group, *_combined(group)) for group in groups.values()]
+    errors = _get_executor().map(lambda push: _send(push[0][0].token, push[1], push[2]), pushes)
+    sent = failed = parked = 0
+    for (group, _, _), error in zip(pushes, errors):
+        if error is None:
+            sent += 1
+            for row in group:
+                db.delete(row)
+            continue
+        failed += 1
+        for row in group:
+            row.attempts += 1
+            row.last_error = error
+            if row.attempts >= settings.push_max_attempts:
+                row.next_attempt_at = None  # give up
+                parked += 1
+            else:
+                row.next_attempt_at = now + _backoff(row.attempts)
+    db.commit()
+
+    if failed or expired:
+        print(f"[Push] Sent {sent} push(es), {failed} failed, {expired} dropped past their deadline")
+    if parked:
+        _report_parked(db)
+    return len(rows)
+
+
+def _report_parked(db: Session):
+    """
+    Log how many pushes were given up on.
+    """
+    count = db.execute(
+        select(func.count()).select_from(models.PushOutbox).where(models.PushOutbox.next_attempt_at.is_(None))
+    ).scalar()
+    print(f"[Push] {count} push(es) parked after {settings.push_max_attempts} failed attempts "
+          f"(purged after {settings.push_parked_retention_hours}h)")
+
+
+def purge_parked_pushes() -> int:
+    """
+    Scheduler job: delete parked pushes older than the retention period. Returns the number deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.push_parked_retention_hours)
+    db: Session = SessionLocal()
+    try:
+        deleted = db.execute(
+            delete(models.PushOutbox).where(
+                models.PushOutbox.next_attempt_at.is_(None),
+                models.PushOutbox.created_at < cutoff
+            )
+        ).rowcount
+        db.commit()
+    except Exception as e:
+        print(f"[Push ERROR] {e}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+    if deleted:
+        print(f"[Push] Purged {deleted} parked push(es)")
+    return deleted
+
+
+def dispatch_pushes() -> int:
+    """
+    Scheduler job: send due pushes until the outbox is drained. Returns the number of rows processed.
+    """
+    db: Session = SessionLocal()
+    processed = 0
+    try:
+        while True:
+            claimed = _dispatch_batch(db, datetime.now(timezone.utc))
+            processed += claimed
+            if claimed < _batch_limit():
+                return processed
+    except Exception as e:
+        print(f"[Push ERROR] {e}")
+        db.rollback()
+        return processed
+    finally:
+        db.close()
+
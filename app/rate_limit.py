@@ -0,0 +1,251 @@
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+from cachetools import TTLCache
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.oauth2 import token_user_id
+
+"""
+Token-bucket rate limiting.
+
+`RateLimitMiddleware` (plain ASGI) matches each request against `RULES`
+(first match wins) and takes one token from the bucket of that rule and
+caller. Callers are identified by the user id of a validly signed bearer
+token, falling back to the client IP; rules for unauthenticated endpoints
+(login, signup, refresh) always key by IP. Rejected requests get a 429 with
+Retry-After straight from the middleware, so they never reach a route,
+dependency or database session.
+
+Buckets live in an in-process LRU by default, so with several workers or
+replicas each enforces its own budget. `settings.rate_limit_backend =
+"database"` keeps them in the rate_limit_buckets table instead, shared by
+all processes (one atomic upsert per request); the outbound "push" bucket of
+app.push_dispatch uses the same backend. Other stores can be installed with
+`set_rate_limit_backend()`.
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Budget for requests matching a path prefix (or exact path) and, optionally, methods."""
+    name: str
+    prefix: str
+    rate: float  # tokens per second; 0 disables limiting for the rule
+    burst: int
+    methods: Optional[FrozenSet[str]] = None
+    by_ip: bool = False  # key by client IP even for authenticated requests
+    exact: bool = False
+
+
+RULES: List[RateLimitRule] = [
+    RateLimitRule("exempt", "/health", 0, 0),
+    RateLimitRule("exempt", "/metrics", 0, 0),
+    # Password guessing / signup spam: per IP, bcrypt is expensive
+    RateLimitRule("login", "/login", settings.rate_limit_login_per_minute / 60, settings.rate_limit_login_burst,
+                  frozenset({"POST"}), by_ip=True),
+    RateLimitRule("signup", "/users/", settings.rate_limit_login_per_minute / 60, settings.rate_limit_login_burst,
+                  frozenset({"POST"}), by_ip=True, exact=True),
+    RateLimitRule("refresh", "/token/refresh", settings.rate_limit_login_per_minute / 60, settings.rate_limit_login_burst,
+                  frozenset({"POST"}), by_ip=True),
+    # Polling endpoints
+    RateLimitRule("poll", "/notifications", settings.rate_limit_poll_per_second, settings.rate_limit_poll_burst,
+                  frozenset({"GET"})),
+    RateLimitRule("default", "/", settings.rate_limit_per_second, settings.rate_limit_burst),
+]
+
+
+class RateLimitBackend(ABC):
+    """
+    Bucket storage. Non-blocking implementations are called from the event
+    loop (the in-process one only holds a lock for a few microseconds);
+    blocking ones (network round trips) are run in the threadpool.
+    """
+    blocking = False
+
+    @abstractmethod
+    def take(self, key: str, rate: float, burst: int, count: int = 1) -> float:
+        """
+        Take `count` (at most `burst`) tokens from `key`'s bucket, all or none.
+        Returns 0 if allowed, otherwise the seconds until they are available.
+        """
+
+    def prune(self) -> int:
+        """
+        Drop idle buckets; returns how many. Self-expiring stores need not override it.
+        """
+        return 0
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    In-process buckets: key -> [tokens, last refill (monotonic)].
+    """
+
+    def __init__(self, max_keys: int):
+        # Idle buckets are full again after burst / rate seconds; an hour covers any sane budget
+        self._buckets: TTLCache = TTLCache(maxsize=max_keys, ttl=3600)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, count: int = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= count:
+                bucket[0] = tokens - count
+                return 0.0
+            bucket[0] = tokens
+            return (count - tokens) / rate
+
+
+# Tokens in the bucket after refilling it up to now, capped at the burst size
+# (CASE rather than LEAST / MIN so the statement runs on PostgreSQL and SQLite)
+_ELAPSED = "CASE WHEN :now > rate_limit_buckets.updated_at THEN :now - rate_limit_buckets.updated_at ELSE 0 END"
+_AVAILABLE = f"rate_limit_buckets.tokens + ({_ELAPSED}) * :rate"
+_REFILLED = f"CASE WHEN {_AVAILABLE} > :burst THEN :burst ELSE {_AVAILABLE} END"
+
+_TAKE_SQL = text(f"""
+    INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (:key, :burst - :count, :now)
+    ON CONFLICT (key) DO UPDATE
+    SET tokens = {_REFILLED} - :count, updated_at = :now
+    WHERE {_REFILLED} >= :count
+    RETURNING tokens
+""")
+
+
+class DatabaseRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in the rate_limit_buckets table, shared by every process using the database.
+    A take is one upsert that only changes the row when a token is available,
+    so concurrent takes from any number of workers never overdraw a bucket.
+    """
+    blocking = True
+    idle_seconds = 3600
+
+    def take(self, key: str, rate: float, burst: int, count: int = 1) -> float:
+        now = time.time()
+        params = {"key": key, "rate": rate, "burst": burst, "count": count, "now": now}
+        with engine.begin() as conn:
+            if conn.execute(_TAKE_SQL, params).first():
+                return 0.0
+            row = conn.execute(
+                text("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = :key"), {"key": key}
+            ).first()
+        if row is None:  # pruned in between
+            return 0.0
+        tokens = min(float(burst), row.tokens + max(now - row.updated_at, 0.0) * rate)
+        return max((count - tokens) / rate, 0.001)
+
+    def prune(self) -> int:
+        # An idle bucket is full again after burst / rate seconds; an hour covers any sane budget
+        with engine.begin() as conn:
+            return conn.execute(
+                text("DELETE FROM rate_limit_buckets WHERE updated_at < :cutoff"),
+                {"cutoff": time.time() - self.idle_seconds}
+            ).rowcount
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """
+    The installed backend, or the one selected by `settings.rate_limit_backend`.
+    """
+    global _backend
+    if _backend is None:
+        if settings.rate_limit_backend == "database":
+            _backend = DatabaseRateLimitBackend()
+        elif settings.rate_limit_backend == "memory":
+            _backend = MemoryRateLimitBackend(settings.rate_limit_max_keys)
+        else:
+            raise ValueError(f"Unknown rate limit backend: {settings.rate_limit_backend}")
+    return _backend
+
+
+def prune_rate_limit_buckets() -> int:
+    """
+    Scheduler job: drop idle buckets of the shared backend.
+    """
+    deleted = get_rate_limit_backend().prune()
+    if deleted:
+        print(f"[RateLimit] Pruned {deleted} idle bucket(s)")
+    return deleted
+
+
+def set_rate_limit_backend(backend: Optional[RateLimitBackend]):
+    """
+    Install a shared rate limit backend (None restores the in-process default).
+    """
+    global _backend
+    _backend = backend
+
+
+def match_rule(method: str, path: str) -> Optional[RateLimitRule]:
+    for rule in RULES:
+        matched = path == rule.prefix if rule.exact else path.startswith(rule.prefix)
+        if matched and (rule.methods is None or method in rule.methods):
+            return rule
+    return None
+
+
+def _client_ip(scope) -> str:
+    if settings.rate_limit_trust_forwarded_for:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing `RULES`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rule = match_rule(scope["method"], scope["path"])
+        if rule is None or rule.rate <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        user_id = None if rule.by_ip else token_user_id(scope)
+        identity = f"user:{user_id}" if user_id else f"ip:{_client_ip(scope)}"
+        backend = get_rate_limit_backend()
+        key = f"{rule.name}:{identity}"
+        if backend.blocking:
+            retry_after = await run_in_threadpool(backend.take, key, rule.rate, rule.burst)
+        else:
+            retry_after = backend.take(key, rule.rate, rule.burst)
+        if not retry_after:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": "Too many requests"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(math.ceil(retry_after)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
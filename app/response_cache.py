@@ -0,0 +1,253 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.directory import etag_matches
+from app.negotiation import MSGPACK_MEDIA_TYPE, accepts_msgpack, encode_msgpack
+
+"""
+Per-user response cache for read-mostly list endpoints.
+
+Responses are cached as pre-serialized JSON bytes plus an ETag, keyed by
+(user id, route key) - e.g. "medicines", "schedules", "schedules/medicine/7".
+Mutating endpoints call `invalidate(user_id, prefix, ...)` after committing,
+which drops every cached route of that user starting with one of the prefixes.
+MessagePack bodies (`Accept: application/msgpack`) are cached separately
+under "<route key>#msgpack", so the same prefixes invalidate them.
+
+A cache hit - and a conditional request whose If-None-Match matches the
+cached ETag (answered with 304) - never touches the database, as long as the
+endpoint authenticates with `get_current_user_id` (token only).
+
+The default backend is an in-process LRU (with a TTL as a safety net); with
+several worker processes its invalidations only reach the worker that
+handled the write. `settings.response_cache_backend = "database"` keeps the
+entries in each worker's memory but their per-user versions in the
+response_cache_versions table, so an invalidation on any worker retires the
+user's entries on all of them; a hit then costs one primary-key lookup
+instead of the route's queries. Other stores can be installed with
+`set_cache_backend()`.
+
+With read replicas (app.database), entries are also filled from replica
+reads: requests inside the read-your-writes window read the primary, so a
+replica read only caches stale rows if replication lags behind by more than
+`settings.replica_stickiness_seconds`.
+"""
+
+CacheEntry = Tuple[str, bytes]  # (etag, body)
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cached responses. Implementations must be thread-safe
+    (sync endpoints run in the threadpool).
+    """
+
+    @abstractmethod
+    def get(self, user_id: int, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    def version(self, user_id: int) -> int:
+        """
+        Counter bumped by every invalidation of the user.
+        """
+
+    @abstractmethod
+    def set(self, user_id: int, key: str, entry: CacheEntry, version: int):
+        """
+        Store `entry` unless the user was invalidated since `version` was read
+        (the response would have been built from stale rows).
+        """
+
+    @abstractmethod
+    def invalidate(self, user_id: int, prefixes: Tuple[str, ...]):
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process LRU of users, each holding [version, {route key: entry}].
+    """
+
+    def __init__(self, max_users: int, ttl_seconds: int):
+        self._users: TTLCache = TTLCache(maxsize=max_users, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            slot = self._users.get(user_id)
+            return slot[1].get(key) if slot else None
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            slot = self._users.get(user_id)
+            return slot[0] if slot else 0
+
+    def set(self, user_id: int, key: str, entry: CacheEntry, version: int):
+        with self._lock:
+            slot = self._users.get(user_id)
+            if slot is None:
+                if version != 0:
+                    return
+                slot = self._users[user_id] = [0, {}]
+            if slot[0] == version:
+                slot[1][key] = entry
+
+    def invalidate(self, user_id: int, prefixes: Tuple[str, ...]):
+        with self._lock:
+            slot = self._users.get(user_id)
+            if slot is None:
+                # Keep a marker so responses being built right now are not stored
+                self._users[user_id] = [1, {}]
+                return
+            slot[0] += 1
+            for key in [key for key in slot[1] if key.startswith(prefixes)]:
+                del slot[1][key]
+
+
+class DatabaseCacheBackend(CacheBackend):
+    """
+    Entries in an in-process LRU of users, each holding [version, {route key: entry}];
+    the current versions live in the response_cache_versions table, shared by all
+    workers. Invalidation is per user: it retires all of the user's entries
+    (every worker drops them on its next lookup), not only the given prefixes.
+    """
+
+    def __init__(self, max_users: int, ttl_seconds: int):
+        self._users: TTLCache = TTLCache(maxsize=max_users, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: str) -> Optional[CacheEntry]:
+        version = self.version(user_id)
+        with self._lock:
+            slot = self._users.get(user_id)
+            return slot[1].get(key) if slot and slot[0] == version else None
+
+    def version(self, user_id: int) -> int:
+        with engine.connect() as conn:
+            version = conn.execute(
+                text("SELECT version FROM response_cache_versions WHERE user_id = :user_id"), {"user_id": user_id}
+            ).scalar()
+        return version or 0
+
+    def set(self, user_id: int, key: str, entry: CacheEntry, version: int):
+        with self._lock:
+            slot = self._users.get(user_id)
+            if slot is None or slot[0] < version:
+                slot = self._users[user_id] = [version, {}]
+            if slot[0] == version:  # an older version's entry is never stored over a newer one
+                slot[1][key] = entry
+
+    def invalidate(self, user_id: int, prefixes: Tuple[str, ...]):
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO response_cache_versions (user_id, version) VALUES (:user_id, 1) "
+                    "ON CONFLICT (user_id) DO UPDATE SET version = response_cache_versions.version + 1"
+                ),
+                {"user_id": user_id}
+            )
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    The installed backend, or the one selected by `settings.response_cache_backend`.
+    """
+    global _backend
+    if _backend is None:
+        if settings.response_cache_backend == "database":
+            _backend = DatabaseCacheBackend(settings.response_cache_max_users, settings.response_cache_ttl_seconds)
+        elif settings.response_cache_backend == "memory":
+            _backend = MemoryCacheBackend(settings.response_cache_max_users, settings.response_cache_ttl_seconds)
+        else:
+            raise ValueError(f"Unknown response cache backend: {settings.response_cache_backend}")
+    return _backend
+
+
+def set_cache_backend(backend: Optional[CacheBackend]):
+    """
+    Install a shared cache backend (None restores the in-process default).
+    """
+    global _backend
+    _backend = backend
+
+
+def invalidate(user_id: int, *prefixes: str):
+    """
+    Drop the user's cached responses whose route key starts with any of `prefixes`.
+    Call after the write has been committed.
+    """
+    if settings.response_cache_enabled:
+        get_cache_backend().invalidate(user_id, prefixes)
+
+
+def cached_entry(
+    user_id: int,
+    key: str,
+    adapter: TypeAdapter,
+    load: Callable[[], object],
+    as_msgpack: bool = False,
+) -> CacheEntry:
+    """
+    The user's cached (etag, body) for `key`, or build it with `load()`
+    (validated and serialized through `adapter`, as JSON or MessagePack) and cache it.
+    """
+    if as_msgpack:
+        key += "#msgpack"
+    backend = get_cache_backend() if settings.response_cache_enabled else None
+    entry = backend.get(user_id, key) if backend else None
+    if entry is None:
+        version = backend.version(user_id) if backend else 0
+        value = adapter.validate_python(load())
+        if as_msgpack:
+            body = encode_msgpack(adapter.dump_python(value, mode="json"))
+        else:
+            body = adapter.dump_json(value)
+        entry = (f'"{hashlib.sha256(body).hexdigest()[:16]}"', body)
+        if backend:
+            backend.set(user_id, key, entry, version)
+    return entry
+
+
+def entry_response(request: Request, entry: CacheEntry, as_msgpack: bool = False) -> Response:
+    """
+    JSON (or MessagePack) response for a cache entry; 304 when If-None-Match matches its ETag.
+    """
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization, Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    media_type = MSGPACK_MEDIA_TYPE if as_msgpack else "application/json"
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def cached_response(
+    request: Request,
+    user_id: int,
+    key: str,
+    adapter: TypeAdapter,
+    load: Callable[[], object],
+) -> Response:
+    """
+    Shorthand for `entry_response(request, cached_entry(...))`, in the format the client accepts.
+    """
+    as_msgpack = wants_msgpack(request)
+    return entry_response(request, cached_entry(user_id, key, adapter, load, as_msgpack), as_msgpack)
+
+
+def wants_msgpack(request: Request) -> bool:
+    return accepts_msgpack(request.headers.get("accept"))
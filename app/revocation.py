@@ -0,0 +1,164 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+"""
+Token revocation denylist.
+
+Revocations are rows in `token_revocations`, keyed by what they revoke:
+"jti:<token id>" (one token), "sid:<session id>" (every token of a login
+session) or "user:<user id>" (a disabled account). Every worker keeps the
+live keys in memory - a Bloom filter in front of an exact set - and syncs
+them from the table every `settings.revocation_sync_seconds` (new rows only;
+a full reload every `settings.revocation_full_sync_seconds` drops expired
+ones). Checking a token therefore never touches the database; a revocation
+made by another worker takes effect within one sync interval.
+"""
+
+SYNC_OVERLAP = timedelta(seconds=60)  # re-read recent rows in case of late commits
+PENDING_KEY = "pending_revocations"  # Session.info entry: keys to apply once the session commits
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (no false negatives).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationList:
+    """
+    In-memory view of the revocation table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Set[str] = set()
+        self._bloom = BloomFilter(settings.revocation_bloom_capacity, settings.revocation_bloom_error_rate)
+        self._added_during_reload: Optional[Set[str]] = None
+        self._watermark: Optional[datetime] = None
+        self._last_full_sync = 0.0
+
+    def is_revoked(self, *keys: str) -> bool:
+        # Lock-free: the Bloom filter rules out almost every key, the set confirms the rest
+        bloom, revoked = self._bloom, self._keys
+        return any(key in bloom and key in revoked for key in keys)
+
+    def add(self, key: str):
+        with self._lock:
+            self._keys.add(key)
+            self._bloom.add(key)
+            if self._added_during_reload is not None:
+                self._added_during_reload.add(key)
+
+    def sync(self, db: Session) -> bool:
+        """
+        Pull new revocations from the table, or reload everything live
+        periodically. Returns True for a full reload.
+        """
+        now = datetime.now(timezone.utc)
+        full = self._watermark is None or time.monotonic() - self._last_full_sync >= settings.revocation_full_sync_seconds
+        query = select(models.TokenRevocation.key, models.TokenRevocation.created_at).where(
+            models.TokenRevocation.expires_at > now
+        )
+        if full:
+            with self._lock:
+                self._added_during_reload = set()
+        else:
+            query = query.where(models.TokenRevocation.created_at >= self._watermark - SYNC_OVERLAP)
+        try:
+            rows = db.execute(query).all()
+        except Exception:
+            with self._lock:
+                self._added_during_reload = None
+            raise
+
+        if full:
+            keys = {key for key, _ in rows}
+            with self._lock:
+                keys |= self._added_during_reload
+                bloom = BloomFilter(max(settings.revocation_bloom_capacity, 2 * len(keys)), settings.revocation_bloom_error_rate)
+                for key in keys:
+                    bloom.add(key)
+                self._keys, self._bloom = keys, bloom
+                self._added_during_reload = None
+            self._last_full_sync = time.monotonic()
+        else:
+            with self._lock:
+                for key, _ in rows:
+                    self._keys.add(key)
+                    self._bloom.add(key)
+        self._watermark = max((created_at for _, created_at in rows), default=self._watermark or now)
+        return full
+
+
+revocations = RevocationList()
+
+
+def revoke(db: Session, key: str, expires_at: datetime) -> bool:
+    """
+    Record a revocation. The caller commits; the key is applied to this
+    worker's denylist only once the commit succeeds (a rollback discards it).
+    Returns False if `key` was already revoked.
+    """
+    inserted = db.execute(
+        pg_insert(models.TokenRevocation)
+        .values(key=key, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=["key"])
+        .returning(models.TokenRevocation.id)
+    ).scalar()
+    db.info.setdefault(PENDING_KEY, []).append(key)
+    return inserted is not None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_revocations(session: Session):
+    for key in session.info.pop(PENDING_KEY, ()):
+        revocations.add(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_revocations(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def sync_revocations():
+    """
+    Scheduler job / startup step: sync the in-memory denylist; expired rows
+    are purged on full reloads.
+    """
+    db = SessionLocal()
+    try:
+        if revocations.sync(db):
+            db.execute(delete(models.TokenRevocation).where(models.TokenRevocation.expires_at <= datetime.now(timezone.utc)))
+            db.commit()
+    finally:
+        db.close()
@@ -1,17 +1,19 @@
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app import models, schemas, utils
-from app.oauth2 import create_access_token
+from app.oauth2 import REFRESH_TOKEN_EXPIRE_DAYS, create_token_pair, decode_token, get_token_claims
+from app.revocation import revoke, revocations
 
 router = APIRouter(tags=["Auth"])
 
 @router.post("/login", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
-    Authenticate user and return an access token.
+    Authenticate user and return an access token and a refresh token.
     - `username`: User email (as username).
     - `password`: User password.
     """
@@ -19,5 +21,50 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
     if not user or not utils.verify_password(form_data.password, user.password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid credentials")
-    access_token = create_access_token(data={"user_id": user.id})
-    return {"access_token": access_token, "token_type": "bearer"}
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account disabled")
+    return create_token_pair(user.id)
+
+@router.post("/token/refresh", response_model=schemas.Token)
+def refresh_token(body: schemas.TokenRefresh, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access/refresh token pair.
+    Refresh tokens are single use: presenting one twice (e.g. a stolen copy)
+    revokes the whole login session.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    claims = decode_token(body.refresh_token, credentials_exception, token_type="refresh", check_revocation=False)
+    user_id, session_id = claims["user_id"], claims.get("sid")
+    if not session_id or revocations.is_revoked(f"user:{user_id}", f"sid:{session_id}"):
+        raise credentials_exception
+
+    expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+    if not revoke(db, f"jti:{claims['jti']}", expires_at):
+        # Already used: someone else holds a copy of this token
+        revoke(db, f"sid:{session_id}", expires_at)
+        db.commit()
+        print(f"[Auth] Refresh token reuse for user {user_id}; session revoked")
+        raise credentials_exception
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is None or not user.is_active:
+        db.rollback()
+        raise credentials_exception
+    db.commit()
+    return create_token_pair(user.id, session_id)
+
+@router.post("/logout")
+def logout(claims: dict = Depends(get_token_claims), db: Session = Depends(get_db)):
+    """
+    Revoke the current access token and its login session (refresh tokens included).
+    """
+    if claims.get("jti"):
+        revoke(db, f"jti:{claims['jti']}", datetime.fromtimestamp(claims["exp"], timezone.utc))
+    if claims.get("sid"):
+        revoke(db, f"sid:{claims['sid']}", datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    db.commit()
+    return {"message": "Logged out"}
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from typing import List
+
+from app import models, schemas
+from app.database import get_db
+from app.oauth2 import get_current_user
+from app.routers.medicines import cached_medicines
+from app.routers.notifications import notification_stats
+from app.routers.schedules import cached_schedules
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+
+"""
+Dashboard router
+
+Everything the app shows on launch in one request: the user, medicines,
+schedules, notification stats and the newest unread notifications. It
+replaces five separate calls (each re-authenticating with its own session)
+with one authentication and one session:
+
+- medicines and schedules come from the per-user response cache (no query
+  when warm) and are spliced into the body as already-serialized JSON,
+- notification stats are one GROUP BY query,
+- unread notifications are one query on (user_id, is_read, created_at).
+
+A single session uses a single connection, so the queries run back to back;
+with a warm cache that is three queries in total (user, stats, unread).
+"""
+
+_user = TypeAdapter(schemas.UserOut)
+_stats = TypeAdapter(schemas.NotificationStats)
+_notification_list = TypeAdapter(List[schemas.NotificationOut])
+
+
+@router.get("", response_model=schemas.DashboardOut)
+def get_dashboard(
+    unread_limit: int = Query(20, ge=0, le=100, description="Maximum number of unread notifications to include"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Launch data for the current user in one response.
+    Same shapes as /users/me, /medicines/, /schedules/,
+    /notifications/stats/overview and /notifications/?unread_only=true.
+    """
+    _, medicines = cached_medicines(db, current_user.id)
+    _, schedules = cached_schedules(db, current_user.id)
+    stats = notification_stats(db, current_user.id)
+    unread = (
+        db.query(models.Notification)
+        .filter(models.Notification.user_id == current_user.id, models.Notification.is_read == False)
+        .order_by(models.Notification.created_at.desc())
+        .limit(unread_limit)
+        .all()
+    ) if unread_limit else []
+
+    body = b"".join([
+        b'{"user":', _user.dump_json(_user.validate_python(current_user)),
+        b',"medicines":', medicines,
+        b',"schedules":', schedules,
+        b',"notification_stats":', _stats.dump_json(_stats.validate_python(stats)),
+        b',"unread_notifications":', _notification_list.dump_json(_notification_list.validate_python(unread)),
+        b"}",
+    ])
+    return Response(body, media_type="application/json", headers={"Cache-Control": "private, no-cache"})
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, selectinload
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, select, insert, update, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional
 
 from app.database import get_db
+from app.followups import cancel_followups
 from app import schemas, models
+from app.negotiation import NegotiatedResponse
 from app.oauth2 import get_current_user
+from app.response_cache import invalidate
+from app.utils_time import get_zone
 
 router = APIRouter(
     prefix="/intakes",
@@ -17,77 +23,232 @@ def create_intake(intake: schemas.MedicineIntakeCreate, db: Session = Depends(ge
     """
     Log a medicine intake for the current user and decrement inventory.
     - `intake.medicine_id`: ID of the medicine being taken.
-    """
-    # Verify the medicine exists and belongs to the user
-    medicine = db.query(models.Medicine).filter(
-        models.Medicine.id == intake.medicine_id,
-        models.Medicine.user_id == current_user.id
-    ).first()
-    if not medicine:
-        raise HTTPException(status_code=404, detail="Medicine not found for this user")
 
-    # Decrement inventory if available (but don't go below 0)
-    if medicine.inventory is not None and medicine.inventory > 0:
-        medicine.inventory -= 1
+    The ownership check, inventory decrement and log insert run as a single
+    statement, so concurrent intakes for the same medicine never lose an update.
+    Pending follow-up reminders for the medicine are cancelled.
+    """
+    # Decrement inventory (never below 0) only if the medicine belongs to the user;
+    # untracked inventory (NULL) stays NULL - GREATEST would turn it into 0
+    decremented = (
+        update(models.Medicine)
+        .where(
+            models.Medicine.id == intake.medicine_id,
+            models.Medicine.user_id == current_user.id
+        )
+        .values(inventory=case(
+            (models.Medicine.inventory.is_(None), None),
+            else_=func.greatest(models.Medicine.inventory - 1, 0)
+        ))
+        .returning(models.Medicine.id, models.Medicine.name, models.Medicine.dosage)
+        .cte("decremented")
+    )
 
-    new_intake = models.MedicineIntakeLog(
-        medicine_id=intake.medicine_id,
-        user_id=current_user.id,
-        taken_at=datetime.now()  # will be overwritten by DB default if server_default used
+    # Insert the log row for the medicine that was actually updated (taken_at from DB default)
+    inserted = (
+        insert(models.MedicineIntakeLog)
+        .from_select(
+            ["medicine_id", "user_id"],
+            select(decremented.c.id, literal(current_user.id))
+        )
+        .returning(
+            models.MedicineIntakeLog.id,
+            models.MedicineIntakeLog.medicine_id,
+            models.MedicineIntakeLog.taken_at
+        )
+        .cte("inserted")
     )
-    db.add(new_intake)
+
+    row = db.execute(
+        select(
+            inserted.c.id,
+            inserted.c.medicine_id,
+            inserted.c.taken_at,
+            decremented.c.name.label("medicine_name"),
+            decremented.c.dosage.label("medicine_dosage")
+        ).join(decremented, decremented.c.id == inserted.c.medicine_id)
+    ).mappings().first()
+
+    if not row:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Medicine not found for this user")
+
     db.commit()
-    db.refresh(new_intake)
-
-    return {
-        "id": new_intake.id,
-        "medicine_id": new_intake.medicine_id,
-        "taken_at": new_intake.taken_at,
-        "medicine_name": medicine.name,
-        "medicine_dosage": medicine.dosage
-    }
-
-@router.get("/", response_model=List[schemas.MedicineIntakeWithMedicineOut])
-def get_intakes(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Inventory changed; medicine and schedule lists show it
+    invalidate(current_user.id, "medicines", "schedules")
+    cancel_followups(db, current_user.id, [(row["medicine_id"], row["taken_at"])])
+    return dict(row)
+
+@router.post("/batch", response_model=List[schemas.MedicineIntakeBatchResult])
+def create_intakes_batch(batch: schemas.MedicineIntakeBatchCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Log many medicine intakes at once (offline sync from the mobile app).
+    - `batch.intakes`: list of (medicine_id, taken_at, client_uuid) entries.
+
+    Replays are idempotent on `client_uuid`: entries already synced are reported
+    as 'duplicate' and do not decrement inventory again. Results are returned in
+    the same order as the submitted entries.
+    """
+    # Deduplicate within the request itself (first occurrence wins)
+    items = {}
+    for item in batch.intakes:
+        items.setdefault(str(item.client_uuid), item)
+
+    # Validate ownership of every referenced medicine in one query
+    medicine_ids = {item.medicine_id for item in items.values()}
+    owned_ids = set(db.execute(
+        select(models.Medicine.id).where(
+            models.Medicine.id.in_(medicine_ids),
+            models.Medicine.user_id == current_user.id
+        )
+    ).scalars())
+
+    rows = [
+        {
+            "medicine_id": item.medicine_id,
+            "user_id": current_user.id,
+            "client_uuid": client_uuid,
+            "taken_at": _as_user_aware(item.taken_at, current_user) if item.taken_at else func.now()
+        }
+        for client_uuid, item in items.items()
+        if item.medicine_id in owned_ids
+    ]
+
+    created = {}
+    if rows:
+        # Insert logs, skipping UUIDs that were already synced
+        inserted = (
+            pg_insert(models.MedicineIntakeLog)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_intake_user_client_uuid")
+            .returning(
+                models.MedicineIntakeLog.id,
+                models.MedicineIntakeLog.medicine_id,
+                models.MedicineIntakeLog.taken_at,
+                models.MedicineIntakeLog.client_uuid
+            )
+            .cte("inserted")
+        )
+
+        # Apply one aggregated decrement per medicine for the logs actually inserted
+        taken_counts = (
+            select(inserted.c.medicine_id, func.count().label("taken"))
+            .group_by(inserted.c.medicine_id)
+            .subquery("taken_counts")
+        )
+        decremented = (
+            update(models.Medicine)
+            .where(
+                models.Medicine.id == taken_counts.c.medicine_id,
+                models.Medicine.inventory.isnot(None)  # untracked inventory stays NULL
+            )
+            .values(inventory=func.greatest(models.Medicine.inventory - taken_counts.c.taken, 0))
+            .returning(models.Medicine.id)
+            .cte("decremented")
+        )
+
+        for row in db.execute(select(inserted).add_cte(decremented)).mappings():
+            created[row["client_uuid"]] = row
+        db.commit()
+        if created:
+            invalidate(current_user.id, "medicines", "schedules")
+            cancel_followups(db, current_user.id, [(row["medicine_id"], row["taken_at"]) for row in created.values()])
+
+    results = []
+    for item in batch.intakes:
+        client_uuid = str(item.client_uuid)
+        row = created.pop(client_uuid, None)
+        if row is not None:
+            results.append({
+                "client_uuid": item.client_uuid,
+                "status": "created",
+                "intake": {"id": row["id"], "medicine_id": row["medicine_id"], "taken_at": row["taken_at"]}
+            })
+        elif item.medicine_id not in owned_ids:
+            results.append({"client_uuid": item.client_uuid, "status": "not_found", "intake": None})
+        else:
+            results.append({"client_uuid": item.client_uuid, "status": "duplicate", "intake": None})
+    return results
+
+def _as_user_aware(taken_at: datetime, user: models.User) -> datetime:
+    """
+    Interpret naive client timestamps as the user's local time.
     """
-    Retrieve medicine intake logs for the current user (most recent first).
+    if taken_at.tzinfo is None:
+        return taken_at.replace(tzinfo=get_zone(user.timezone))
+    return taken_at
+
+@router.get("/", response_model=List[schemas.MedicineIntakeWithMedicineOut], response_class=NegotiatedResponse)
+def get_intakes(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    medicine_id: Optional[int] = Query(None, description="Only intakes of this medicine"),
+    taken_from: Optional[datetime] = Query(None, alias="from", description="Only intakes taken at or after this time (naive values are the user's local time)"),
+    taken_to: Optional[datetime] = Query(None, alias="to", description="Only intakes taken before this time (naive values are the user's local time)"),
+    sort: Literal["asc", "desc"] = Query("desc", description="Sort by taken_at ascending or descending"),
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of records to return (default: all)"),
+):
+    """
+    Retrieve medicine intake logs for the current user (most recent first by default),
+    optionally filtered by medicine and time range. Returns the whole history
+    unless `limit` is given; page with `skip` / `limit`.
+    Sent as MessagePack with `Accept: application/msgpack`.
     """
-    intakes = db.query(models.MedicineIntakeLog).options(
-        selectinload(models.MedicineIntakeLog.medicine)
-    ).filter(
+    query = select(
+        models.MedicineIntakeLog.id,
+        models.MedicineIntakeLog.medicine_id,
+        models.MedicineIntakeLog.taken_at,
+        models.Medicine.name.label("medicine_name"),
+        models.Medicine.dosage.label("medicine_dosage")
+    ).join(
+        models.Medicine, models.Medicine.id == models.MedicineIntakeLog.medicine_id
+    ).where(
         models.MedicineIntakeLog.user_id == current_user.id
-    ).order_by(models.MedicineIntakeLog.taken_at.desc()).all()
-
-    res = []
-    for intake in intakes:
-        res.append({
-            "id": intake.id,
-            "medicine_id": intake.medicine_id,
-            "taken_at": intake.taken_at,
-            "medicine_name": intake.medicine.name if intake.medicine else None,
-            "medicine_dosage": intake.medicine.dosage if intake.medicine else None
-        })
-    return res
+    )
+
+    if medicine_id is not None:
+        query = query.where(models.MedicineIntakeLog.medicine_id == medicine_id)
+    if taken_from is not None:
+        query = query.where(models.MedicineIntakeLog.taken_at >= _as_user_aware(taken_from, current_user))
+    if taken_to is not None:
+        query = query.where(models.MedicineIntakeLog.taken_at < _as_user_aware(taken_to, current_user))
+
+    order = models.MedicineIntakeLog.taken_at.asc() if sort == "asc" else models.MedicineIntakeLog.taken_at.desc()
+    query = query.order_by(order, models.MedicineIntakeLog.id).offset(skip).limit(limit)
+
+    return db.execute(query).mappings().all()
 
 @router.delete("/{intake_id}", status_code=204)
 def delete_intake(intake_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """
     Delete a medicine intake record by ID (for current user) and restore inventory.
+    The delete and the inventory increment run as a single statement.
     """
-    intake = db.query(models.MedicineIntakeLog).filter(
-        models.MedicineIntakeLog.id == intake_id,
-        models.MedicineIntakeLog.user_id == current_user.id
-    ).first()
-    if not intake:
-        raise HTTPException(status_code=404, detail="Intake not found or not authorized")
+    deleted = (
+        delete(models.MedicineIntakeLog)
+        .where(
+            models.MedicineIntakeLog.id == intake_id,
+            models.MedicineIntakeLog.user_id == current_user.id
+        )
+        .returning(models.MedicineIntakeLog.id, models.MedicineIntakeLog.medicine_id)
+        .cte("deleted")
+    )
 
     # Restore inventory when deleting an intake record
-    medicine = db.query(models.Medicine).filter(
-        models.Medicine.id == intake.medicine_id
-    ).first()
-    if medicine:
-        medicine.inventory = (medicine.inventory or 0) + 1
+    restored = (
+        update(models.Medicine)
+        .where(models.Medicine.id == deleted.c.medicine_id)
+        .values(inventory=func.coalesce(models.Medicine.inventory, 0) + 1)
+        .returning(models.Medicine.id)
+        .cte("restored")
+    )
+
+    deleted_id = db.execute(select(deleted.c.id).add_cte(restored)).scalar()
+    if deleted_id is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Intake not found or not authorized")
 
-    db.delete(intake)
     db.commit()
+    invalidate(current_user.id, "medicines", "schedules")
     return None
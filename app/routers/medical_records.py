@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime, timezone
 
+from app.config import settings
 from app.database import get_db
 from app import models, schemas
 from app.oauth2 import get_current_user
-from app.cloudinary import upload_medical_file, delete_medical_file
+from app.cloudinary import public_id_from_url
+from app.file_deletions import queue_file_deletion
+from app.storage import StoredFile, get_storage, delivery_urls_for
+from app.uploads import read_multipart_upload, run_upload
 
 router = APIRouter(
     prefix="/medical-records",
@@ -13,58 +19,111 @@ router = APIRouter(
 )
 
 
+ALLOWED_TYPES = ["image/jpeg", "image/png", "application/pdf"]
+
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["title", "file"],
+                "properties": {
+                    "title": {"type": "string", "description": "Short title for this medical record (e.g. 'Blood Test Report')"},
+                    "file": {"type": "string", "format": "binary", "description": "Medical file (PDF, JPG, or PNG)"},
+                },
+            }
+        }
+    },
+}
+
+
 @router.post(
     "/",
     response_model=schemas.MedicalRecordOut,
     status_code=status.HTTP_201_CREATED,
     summary="Upload a medical record",
     description="Upload a medical document such as prescriptions, reports, X-rays, or PDFs. Files are securely stored and linked to your account.",
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY},
 )
 async def upload_medical_record(
-    title: str = Form(..., description="Short title for this medical record (e.g. 'Blood Test Report')"),
-    file: UploadFile = File(..., description="Medical file (PDF, JPG, or PNG)"),
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
-    Upload a new medical record.
+    Upload a new medical record (multipart form with `title` and `file`).
 
     Supported formats:
     - PDF
     - JPG
     - PNG
 
-    The file is uploaded to secure cloud storage and linked to the logged-in user.
+    The body is streamed (not spooled up front) and rejected as soon as it exceeds
+    the upload size limit. The upload to storage and the DB write run off the event
+    loop, so large files do not block other requests.
     """
+    form = await read_multipart_upload(request, "file", ALLOWED_TYPES, settings.max_upload_bytes)
+    try:
+        title = form.fields.get("title", "").strip()
+        if not title:
+            raise HTTPException(status_code=400, detail="Title is required")
 
-    if not file.content_type:
-        raise HTTPException(status_code=400, detail="Invalid file")
-
-    allowed_types = ["image/jpeg", "image/png", "application/pdf"]
+        storage = get_storage()
+        try:
+            stored = await run_upload(storage.upload, form.file.file, form.file.filename, form.file.content_type)
+        except Exception:
+            raise HTTPException(status_code=500, detail="File upload failed")
+    finally:
+        await form.file.close()
 
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail="Only JPG, PNG, and PDF files are allowed",
-        )
+    return await run_in_threadpool(_save_record, db, current_user.id, title, stored)
 
-    try:
-        file_url, file_type = upload_medical_file(file.file)
-    except Exception:
-        raise HTTPException(status_code=500, detail="File upload failed")
 
+def _save_record(db: Session, user_id: int, title: str, stored: StoredFile) -> models.MedicalRecord:
+    """
+    Persist an uploaded file as a medical record (runs in a worker thread).
+    """
     record = models.MedicalRecord(
-        user_id=current_user.id,
+        user_id=user_id,
         title=title,
-        file_url=file_url,
-        file_type=file_type,
+        file_url=stored.url,
+        file_type=stored.file_type,
+        public_id=stored.public_id,
+        size_bytes=stored.size_bytes,
+        width=stored.width,
+        height=stored.height,
     )
 
     db.add(record)
     db.commit()
     db.refresh(record)
 
-    return record
+    return _record_out(record)
+
+
+def _record_out(record: models.MedicalRecord) -> dict:
+    """
+    Serialize a record with its (cached) thumbnail, preview and signed URLs.
+    """
+    urls = delivery_urls_for(record.id, record.public_id, record.file_type, record.file_url)
+    return {
+        "id": record.id,
+        "title": record.title,
+        # Local files are only served with a signature
+        "file_url": urls.signed_url if get_storage().signed_only else record.file_url,
+        "file_type": record.file_type,
+        "uploaded_at": record.uploaded_at,
+        "size_bytes": record.size_bytes,
+        "width": record.width,
+        "height": record.height,
+        "thumbnail_url": urls.thumbnail_url,
+        "preview_url": urls.preview_url,
+        "signed_url": urls.signed_url,
+        "signed_url_expires_at": (
+            datetime.fromtimestamp(urls.expires_at, tz=timezone.utc) if urls.expires_at else None
+        ),
+    }
 
 
 @router.get(
@@ -79,21 +138,23 @@ def get_medical_records(
 ):
     """
     Returns all medical records uploaded by the authenticated user,
-    ordered from newest to oldest.
+    ordered from newest to oldest. Each record carries a thumbnail and preview
+    URL for lazy loading and a short-lived signed URL for the original file.
     """
-    return (
+    records = (
         db.query(models.MedicalRecord)
         .filter(models.MedicalRecord.user_id == current_user.id)
         .order_by(models.MedicalRecord.uploaded_at.desc())
         .all()
     )
+    return [_record_out(record) for record in records]
 
 
 @router.delete(
     "/{record_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Delete a medical record",
-    description="Delete a medical record by its ID. Also removes the file from Cloudinary."
+    description="Delete a medical record by its ID. The file is removed from storage in the background."
 )
 def delete_medical_record(
     record_id: int,
@@ -107,8 +168,8 @@ def delete_medical_record(
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    # delete from Cloudinary
-    delete_medical_file(record.file_url)
+    # queue the storage delete in the same transaction; a background worker removes the file
+    queue_file_deletion(db, record.public_id or public_id_from_url(record.file_url))
 
     # delete from DB
     db.delete(record)
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List
 from app import models, schemas
 from app.database import get_db
-from app.oauth2 import get_current_user
+from app.oauth2 import get_current_user, get_current_user_id
+from app.response_cache import CacheEntry, cached_entry, entry_response, invalidate, wants_msgpack
 
 router = APIRouter(prefix="/medicines", tags=["Medicines"])
 
+_medicine_list = TypeAdapter(List[schemas.MedicineOut])
+
 # Create
 @router.post("/", response_model=schemas.MedicineOut)
 def create_medicine(med: schemas.MedicineCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
@@ -17,15 +21,19 @@ def create_medicine(med: schemas.MedicineCreate, db: Session = Depends(get_db),
     db.add(medicine)
     db.commit()
     db.refresh(medicine)
+    invalidate(current_user.id, "medicines")
     return medicine
 
 # Read all
 @router.get("/", response_model=List[schemas.MedicineOut])
-def get_medicines(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_medicines(request: Request, db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)):
     """
     Retrieve all medicines for the current user.
+    Served from the per-user response cache; supports ETag / If-None-Match
+    and `Accept: application/msgpack`.
     """
-    return db.query(models.Medicine).filter(models.Medicine.user_id == current_user.id).all()
+    as_msgpack = wants_msgpack(request)
+    return entry_response(request, cached_medicines(db, user_id, as_msgpack), as_msgpack)
 
 # Update
 @router.put("/{medicine_id}", response_model=schemas.MedicineOut)
@@ -40,6 +48,8 @@ def update_medicine(medicine_id: int, med_update: schemas.MedicineCreate, db: Se
         setattr(med, key, value)
     db.commit()
     db.refresh(med)
+    # Schedules embed the medicine
+    invalidate(current_user.id, "medicines", "schedules")
     return med
 
 # Delete
@@ -53,4 +63,16 @@ def delete_medicine(medicine_id: int, db: Session = Depends(get_db), current_use
         raise HTTPException(status_code=404, detail="Medicine not found")
     db.delete(med)
     db.commit()
+    invalidate(current_user.id, "medicines", "schedules")
     return {"message": "Medicine deleted successfully"}
+
+
+def cached_medicines(db: Session, user_id: int, as_msgpack: bool = False) -> CacheEntry:
+    """
+    The user's serialized medicine list (etag, body), through the response cache.
+    """
+    return cached_entry(
+        user_id, "medicines", _medicine_list,
+        lambda: db.query(models.Medicine).filter(models.Medicine.user_id == user_id).all(),
+        as_msgpack
+    )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app import models, schemas
 from app.database import get_db
+from app.fcm_tokens import register_token
 from app.oauth2 import get_current_user
-from app.firebase import send_push_to_user
+from app.negotiation import NegotiatedResponse
+from app.push_dispatch import LANES, PRIORITY_SYSTEM, queue_push_to_user
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
@@ -23,25 +26,13 @@ def register_fcm_token(
     Register a Firebase Cloud Messaging (FCM) token for the current user.
     - Allows multiple tokens per user.
     - Same token can belong to multiple users (multi-account device).
+    - Apps should call this on every start: it refreshes the token's last-seen
+      time, and tokens unseen for a long time are pruned.
     """
-    existing = (
-        db.query(models.UserFCMToken)
-        .filter(
-            models.UserFCMToken.user_id == current_user.id,
-            models.UserFCMToken.fcm_token == token,
-        )
-        .first()
-    )
-
-    if existing:
-        return {"message": "Token already registered"}
-
-    new_token = models.UserFCMToken(user_id=current_user.id, fcm_token=token)
-    db.add(new_token)
-    db.commit()
-    db.refresh(new_token)
-
-    return {"message": "FCM token registered successfully", "token_id": new_token.id}
+    token_id, created = register_token(db, current_user.id, token)
+    if not created:
+        return {"message": "Token already registered", "token_id": token_id}
+    return {"message": "FCM token registered successfully", "token_id": token_id}
 
 
 # -------------------------------
@@ -56,7 +47,7 @@ def create_notification(
     """
     For Testing/ Future Use --> Doctors can send notification to user
     Create a new notification for the current user.
-    Also sends push notifications to all registered devices of this user.
+    Also queues push notifications to all registered devices of this user.
     """
     db_notification = models.Notification(
         user_id=current_user.id,
@@ -67,19 +58,21 @@ def create_notification(
         related_entity_id=notification.related_entity_id,
     )
     db.add(db_notification)
+    # 🔔 Queue push notifications (sent by the push dispatcher)
+    queue_push_to_user(
+        db, current_user.id, db_notification.title, db_notification.message,
+        LANES.get(notification.notification_type, PRIORITY_SYSTEM), db_notification
+    )
     db.commit()
     db.refresh(db_notification)
 
-    # 🔔 Trigger push notifications
-    send_push_to_user(db, current_user.id, db_notification.title, db_notification.message)
-
     return db_notification
 
 
 # -------------------------------
 # Get Notifications with Filters
 # -------------------------------
-@router.get("/", response_model=List[schemas.NotificationOut])
+@router.get("/", response_model=List[schemas.NotificationOut], response_class=NegotiatedResponse)
 def get_notifications(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
@@ -90,6 +83,7 @@ def get_notifications(
 ):
     """
     Retrieve notifications for the current user with optional filters.
+    Sent as MessagePack with `Accept: application/msgpack`.
     """
     query = db.query(models.Notification).filter(models.Notification.user_id == current_user.id)
 
@@ -200,7 +194,7 @@ def delete_notification(
 # -------------------------------
 # Notification Statistics
 # -------------------------------
-@router.get("/stats/overview")
+@router.get("/stats/overview", response_model=schemas.NotificationStats)
 def get_notification_stats(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
@@ -208,24 +202,26 @@ def get_notification_stats(
     """
     Get notification statistics for the current user (total/unread count and breakdown by type).
     """
-    total = db.query(models.Notification).filter(models.Notification.user_id == current_user.id).count()
-    unread = (
-        db.query(models.Notification)
-        .filter(models.Notification.user_id == current_user.id, models.Notification.is_read == False)
-        .count()
-    )
+    return notification_stats(db, current_user.id)
+
 
-    by_type = {}
-    types = (
-        db.query(models.Notification.notification_type, models.Notification.is_read)
-        .filter(models.Notification.user_id == current_user.id)
+def notification_stats(db: Session, user_id: int) -> dict:
+    """
+    Total/unread counts overall and per type, from one aggregate query.
+    """
+    rows = (
+        db.query(
+            models.Notification.notification_type,
+            func.count(),
+            func.count().filter(models.Notification.is_read == False),
+        )
+        .filter(models.Notification.user_id == user_id)
+        .group_by(models.Notification.notification_type)
         .all()
     )
-    for notif_type, is_read in types:
-        if notif_type not in by_type:
-            by_type[notif_type] = {"total": 0, "unread": 0}
-        by_type[notif_type]["total"] += 1
-        if not is_read:
-            by_type[notif_type]["unread"] += 1
-
-    return {"total": total, "unread": unread, "by_type": by_type}
+    by_type = {notif_type: {"total": total, "unread": unread} for notif_type, total, unread in rows}
+    return {
+        "total": sum(counts["total"] for counts in by_type.values()),
+        "unread": sum(counts["unread"] for counts in by_type.values()),
+        "by_type": by_type,
+    }
@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session, selectinload
 from typing import List
 
 from app.database import get_db
 from app import schemas, models
-from app.oauth2 import get_current_user
-from app.utils_time import local_time_to_nepal_timeobj, nepal_time_to_str
+from app.oauth2 import get_current_user, get_current_user_id
+from app.response_cache import CacheEntry, cached_entry, cached_response, entry_response, invalidate, wants_msgpack
+from app.scheduler import reminder_loop
+from app.utils_time import get_zone, next_fire_at, parse_time_of_day, time_of_day_to_str
 
 router = APIRouter(prefix="/schedules", tags=["Schedules"])
 
 """
-Schedules router (Nepal-only time handling)
+Schedules router
 
 Overview
 --------
@@ -28,16 +32,19 @@ Data model notes (fields used by these endpoints):
 - ScheduleTime:
     - id: primary key
     - schedule_id: references MedicineSchedule
-    - time_of_day: stored as a Python time object (NEPAL local time)
+    - time_of_day: stored as a Python time object (the user's local time)
+    - next_fire_at: next UTC instant of time_of_day, used by the reminder engine
+      (creating / editing times wakes the reminder loop through `reminder_loop.notify`)
 
 Important timezone policy
 -------------------------
-- All times handled by endpoints and stored in the database by this router are treated as
-  Nepal local time (Asia/Kathmandu).
+- All times handled by endpoints and stored in the database by this router are wall-clock
+  times in the current user's timezone (`User.timezone`, Asia/Kathmandu by default).
 - Utility functions used:
-    - local_time_to_nepal_timeobj(local_time): converts a string like "14:30" or a time object
-      into a Nepal-local time object to store in the DB.
-    - nepal_time_to_str(time_obj): returns "HH:MM:SS" string for the stored Nepal-local time.
+    - parse_time_of_day(local_time): converts a string like "14:30" or a time object
+      into a naive time object to store in the DB.
+    - next_fire_at(time, zone, after): next UTC occurrence of a wall-clock time in a zone.
+    - time_of_day_to_str(time_obj): returns "HH:MM:SS" string for a stored time.
 
 Frequency fields explanation (precise behavior)
 ----------------------------------------------
@@ -69,7 +76,7 @@ Payload examples
     {"time_of_day": "08:00"}
   ]
 }
-- Returned schedule times are strings in "HH:MM:SS" format representing Nepal local time.
+- Returned schedule times are strings in "HH:MM:SS" format in the user's local time.
 
 Response shape
 --------------
@@ -86,6 +93,8 @@ The endpoints return schedules with nested medicine info and times. Example:
 }
 """
 
+_schedule_list = TypeAdapter(List[schemas.MedicineScheduleWithMedicineOut])
+
 # ---------- Create schedule ----------
 @router.post("/", response_model=schemas.MedicineScheduleWithMedicineOut)
 def create_schedule(
@@ -102,7 +111,7 @@ def create_schedule(
     - `schedule_data.frequency_type`: e.g., "daily", "weekly", "monthly".
     - `schedule_data.frequency_value`: integer multiplier for the frequency_type (see module doc).
     - `schedule_data.times`: list of times (strings "HH:MM" or "HH:MM:SS" OR time objects).
-      These are interpreted as Nepal local times and stored as Nepal-local time objects.
+      These are interpreted as local times in the user's timezone.
 
     Example request (JSON body):
     {
@@ -132,16 +141,23 @@ def create_schedule(
     db.commit()
     db.refresh(schedule)
 
-    # Store times directly as Nepal local time
+    # Store local times with their next occurrence for the reminder engine
+    zone = get_zone(current_user.timezone)
+    now = datetime.now(timezone.utc)
+    fire_times = []
     for time_data in schedule_data.times:
-        nepal_time_obj = local_time_to_nepal_timeobj(time_data.time_of_day)
+        time_of_day = parse_time_of_day(time_data.time_of_day)
+        fire_times.append(next_fire_at(time_of_day, zone, now))
         schedule_time = models.ScheduleTime(
             schedule_id=schedule.id,
-            time_of_day=nepal_time_obj
+            time_of_day=time_of_day,
+            next_fire_at=fire_times[-1]
         )
         db.add(schedule_time)
 
     db.commit()
+    invalidate(current_user.id, "schedules")
+    reminder_loop.notify(fire_times)
 
     # Refresh with relationships
     schedule = db.query(models.MedicineSchedule).options(
@@ -149,107 +165,51 @@ def create_schedule(
         selectinload(models.MedicineSchedule.times)
     ).filter(models.MedicineSchedule.id == schedule.id).first()
 
-    # Build response converting stored times to string
-    resp = {
-        "id": schedule.id,
-        "frequency_type": schedule.frequency_type,
-        "frequency_value": schedule.frequency_value,
-        "created_at": schedule.created_at,
-        "medicine": {
-            "id": schedule.medicine.id,
-            "name": schedule.medicine.name,
-            "dosage": schedule.medicine.dosage,
-            "inventory": schedule.medicine.inventory,
-            "low_threshold": schedule.medicine.low_threshold
-        },
-        "times": [
-            {"id": t.id, "time_of_day": nepal_time_to_str(t.time_of_day)}
-            for t in schedule.times
-        ]
-    }
-
-    return resp
+    return _schedule_out(schedule)
 
 # ---------- Get schedules for a specific medicine ----------
 @router.get("/medicine/{medicine_id}", response_model=List[schemas.MedicineScheduleWithMedicineOut])
 def get_schedules_for_medicine(
         medicine_id: int,
+        request: Request,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        user_id: int = Depends(get_current_user_id)
 ):
     """
     Get all schedules for a specific medicine of the current user.
 
     Returns schedule entries (with nested medicine info and times).
-    All `time_of_day` values are returned as Nepal local time strings "HH:MM:SS".
+    All `time_of_day` values are returned as the user's local time strings "HH:MM:SS".
+    Served from the per-user response cache; supports ETag / If-None-Match.
     """
-    schedules = db.query(models.MedicineSchedule).options(
-        selectinload(models.MedicineSchedule.medicine),
-        selectinload(models.MedicineSchedule.times)
-    ).join(models.Medicine).filter(
-        models.Medicine.id == medicine_id,
-        models.Medicine.user_id == current_user.id
-    ).all()
-
-    out = []
-    for schedule in schedules:
-        out.append({
-            "id": schedule.id,
-            "frequency_type": schedule.frequency_type,
-            "frequency_value": schedule.frequency_value,
-            "created_at": schedule.created_at,
-            "medicine": {
-                "id": schedule.medicine.id,
-                "name": schedule.medicine.name,
-                "dosage": schedule.medicine.dosage,
-                "inventory": schedule.medicine.inventory,
-                "low_threshold": schedule.medicine.low_threshold
-            },
-            "times": [
-                {"id": t.id, "time_of_day": nepal_time_to_str(t.time_of_day)}
-                for t in schedule.times
-            ]
-        })
-    return out
+    def load():
+        schedules = db.query(models.MedicineSchedule).options(
+            selectinload(models.MedicineSchedule.medicine),
+            selectinload(models.MedicineSchedule.times)
+        ).join(models.Medicine).filter(
+            models.Medicine.id == medicine_id,
+            models.Medicine.user_id == user_id
+        ).all()
+        return [_schedule_out(schedule) for schedule in schedules]
+
+    return cached_response(request, user_id, f"schedules/medicine/{medicine_id}", _schedule_list, load)
 
 # ---------- Get all schedules ----------
 @router.get("/", response_model=List[schemas.MedicineScheduleWithMedicineOut])
 def get_all_schedules(
+        request: Request,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        user_id: int = Depends(get_current_user_id)
 ):
     """
     Get all medicine schedules for the current user.
 
-    Useful for listing and display in the UI. Times are Nepal local times.
+    Useful for listing and display in the UI. Times are in the user's timezone.
+    Served from the per-user response cache; supports ETag / If-None-Match
+    and `Accept: application/msgpack`.
     """
-    schedules = db.query(models.MedicineSchedule).options(
-        selectinload(models.MedicineSchedule.medicine),
-        selectinload(models.MedicineSchedule.times)
-    ).join(models.Medicine).filter(
-        models.Medicine.user_id == current_user.id
-    ).all()
-
-    out = []
-    for schedule in schedules:
-        out.append({
-            "id": schedule.id,
-            "frequency_type": schedule.frequency_type,
-            "frequency_value": schedule.frequency_value,
-            "created_at": schedule.created_at,
-            "medicine": {
-                "id": schedule.medicine.id,
-                "name": schedule.medicine.name,
-                "dosage": schedule.medicine.dosage,
-                "inventory": schedule.medicine.inventory,
-                "low_threshold": schedule.medicine.low_threshold
-            },
-            "times": [
-                {"id": t.id, "time_of_day": nepal_time_to_str(t.time_of_day)}
-                for t in schedule.times
-            ]
-        })
-    return out
+    as_msgpack = wants_msgpack(request)
+    return entry_response(request, cached_schedules(db, user_id, as_msgpack), as_msgpack)
 
 # ---------- Get a single schedule ----------
 @router.get("/{schedule_id}", response_model=schemas.MedicineScheduleWithMedicineOut)
@@ -261,7 +221,7 @@ def get_schedule(
     """
     Retrieve a specific schedule by ID for the current user.
 
-    Returns the schedule and its times; all times are Nepal local time strings.
+    Returns the schedule and its times; all times are the user's local time strings.
     """
     schedule = db.query(models.MedicineSchedule).options(
         selectinload(models.MedicineSchedule.medicine),
@@ -274,24 +234,7 @@ def get_schedule(
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
 
-    resp = {
-        "id": schedule.id,
-        "frequency_type": schedule.frequency_type,
-        "frequency_value": schedule.frequency_value,
-        "created_at": schedule.created_at,
-        "medicine": {
-            "id": schedule.medicine.id,
-            "name": schedule.medicine.name,
-            "dosage": schedule.medicine.dosage,
-            "inventory": schedule.medicine.inventory,
-            "low_threshold": schedule.medicine.low_threshold
-        },
-        "times": [
-            {"id": t.id, "time_of_day": nepal_time_to_str(t.time_of_day)}
-            for t in schedule.times
-        ]
-    }
-    return resp
+    return _schedule_out(schedule)
 
 # ---------- Update schedule ----------
 @router.put("/{schedule_id}", response_model=schemas.MedicineScheduleWithMedicineOut)
@@ -305,7 +248,7 @@ def update_schedule(
     Update an existing schedule (frequency or times) for the current user.
 
     - Provide `frequency_type` / `frequency_value` to change frequency metadata.
-    - Provide `times` as Nepal local times (strings or time objects). All times stored as Nepal time.
+    - Provide `times` as local times in the user's timezone (strings or time objects).
     """
     schedule = db.query(models.MedicineSchedule).options(
         selectinload(models.MedicineSchedule.medicine),
@@ -323,16 +266,26 @@ def update_schedule(
     if schedule_update.frequency_value is not None:
         schedule.frequency_value = schedule_update.frequency_value
 
+    fire_times = []
     if schedule_update.times is not None:
         # remove existing times
         db.query(models.ScheduleTime).filter(models.ScheduleTime.schedule_id == schedule.id).delete()
-        # add new times as Nepal local time
+        # add new times as the user's local time
+        zone = get_zone(current_user.timezone)
+        now = datetime.now(timezone.utc)
         for time_data in schedule_update.times:
-            nepal_time_obj = local_time_to_nepal_timeobj(time_data.time_of_day)
-            schedule_time = models.ScheduleTime(schedule_id=schedule.id, time_of_day=nepal_time_obj)
+            time_of_day = parse_time_of_day(time_data.time_of_day)
+            fire_times.append(next_fire_at(time_of_day, zone, now))
+            schedule_time = models.ScheduleTime(
+                schedule_id=schedule.id,
+                time_of_day=time_of_day,
+                next_fire_at=fire_times[-1]
+            )
             db.add(schedule_time)
 
     db.commit()
+    invalidate(current_user.id, "schedules")
+    reminder_loop.notify(fire_times)
 
     # Refresh and return
     schedule = db.query(models.MedicineSchedule).options(
@@ -340,24 +293,7 @@ def update_schedule(
         selectinload(models.MedicineSchedule.times)
     ).filter(models.MedicineSchedule.id == schedule_id).first()
 
-    resp = {
-        "id": schedule.id,
-        "frequency_type": schedule.frequency_type,
-        "frequency_value": schedule.frequency_value,
-        "created_at": schedule.created_at,
-        "medicine": {
-            "id": schedule.medicine.id,
-            "name": schedule.medicine.name,
-            "dosage": schedule.medicine.dosage,
-            "inventory": schedule.medicine.inventory,
-            "low_threshold": schedule.medicine.low_threshold
-        },
-        "times": [
-            {"id": t.id, "time_of_day": nepal_time_to_str(t.time_of_day)}
-            for t in schedule.times
-        ]
-    }
-    return resp
+    return _schedule_out(schedule)
 
 # ---------- Delete schedule ----------
 @router.delete("/{schedule_id}")
@@ -374,4 +310,44 @@ def delete_schedule(schedule_id: int, db: Session = Depends(get_db), current_use
 
     db.delete(schedule)
     db.commit()
+    invalidate(current_user.id, "schedules")
     return {"message": "Schedule deleted successfully"}
+
+
+def cached_schedules(db: Session, user_id: int, as_msgpack: bool = False) -> CacheEntry:
+    """
+    All of the user's serialized schedules (etag, body), through the response cache.
+    """
+    def load():
+        schedules = db.query(models.MedicineSchedule).options(
+            selectinload(models.MedicineSchedule.medicine),
+            selectinload(models.MedicineSchedule.times)
+        ).join(models.Medicine).filter(
+            models.Medicine.user_id == user_id
+        ).all()
+        return [_schedule_out(schedule) for schedule in schedules]
+
+    return cached_entry(user_id, "schedules", _schedule_list, load, as_msgpack)
+
+
+def _schedule_out(schedule: models.MedicineSchedule) -> dict:
+    """
+    Response dict for a schedule with its medicine and times loaded.
+    """
+    return {
+        "id": schedule.id,
+        "frequency_type": schedule.frequency_type,
+        "frequency_value": schedule.frequency_value,
+        "created_at": schedule.created_at,
+        "medicine": {
+            "id": schedule.medicine.id,
+            "name": schedule.medicine.name,
+            "dosage": schedule.medicine.dosage,
+            "inventory": schedule.medicine.inventory,
+            "low_threshold": schedule.medicine.low_threshold
+        },
+        "times": [
+            {"id": t.id, "time_of_day": time_of_day_to_str(t.time_of_day)}
+            for t in schedule.times
+        ]
+    }
@@ -1,8 +1,12 @@
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models, schemas, utils
-from app.oauth2 import get_current_user
+from app.oauth2 import REFRESH_TOKEN_EXPIRE_DAYS, get_current_user
+from app.revocation import revoke
+from app.scheduler import reschedule_user_times
+from app.utils_time import DEFAULT_TIMEZONE, is_valid_timezone
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -16,8 +20,16 @@ def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     if existing:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
+    if user_in.timezone and not is_valid_timezone(user_in.timezone):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown timezone")
+
     hashed = utils.hash_password(user_in.password)
-    user = models.User(full_name=user_in.full_name, email=user_in.email, password=hashed)
+    user = models.User(
+        full_name=user_in.full_name,
+        email=user_in.email,
+        password=hashed,
+        timezone=user_in.timezone or DEFAULT_TIMEZONE
+    )
     db.add(user)
     db.commit()
     db.refresh(user)
@@ -29,3 +41,37 @@ def read_current_user(current_user: models.User = Depends(get_current_user)):
     Get the current authenticated user's information.
     """
     return current_user
+
+@router.patch("/me", response_model=schemas.UserOut)
+def update_current_user(
+    user_update: schemas.UserUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Update the current user's name or timezone.
+    Changing the timezone keeps schedule times at the same local wall-clock
+    time and reschedules their reminders for the new zone.
+    """
+    if user_update.full_name is not None:
+        current_user.full_name = user_update.full_name
+
+    if user_update.timezone is not None and user_update.timezone != current_user.timezone:
+        if not is_valid_timezone(user_update.timezone):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown timezone")
+        current_user.timezone = user_update.timezone
+        reschedule_user_times(db, current_user.id, user_update.timezone)
+
+    db.commit()
+    db.refresh(current_user)
+    return current_user
+
+@router.post("/me/deactivate")
+def deactivate_current_user(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Disable the current account and revoke all of its tokens.
+    """
+    current_user.is_active = False
+    revoke(db, f"user:{current_user.id}", datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    db.commit()
+    return {"message": "Account deactivated"}
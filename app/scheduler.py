@@ -1,80 +1,227 @@
-from datetime import datetime
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
 from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session, selectinload
-from zoneinfo import ZoneInfo
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.database import ReplicaSession, SessionLocal
 from app import models
-from app.firebase import send_push_notification
-from app.utils_time import local_time_to_nepal_timeobj, nepal_time_to_str
+from app.fcm_tokens import live_token, prune_fcm_tokens
+from app.followups import fire_due_followups, schedule_followups
+from app.file_deletions import process_file_deletions
+from app.push_dispatch import (
+    PRIORITY_INVENTORY, PRIORITY_REMINDER, dispatch_pushes, purge_parked_pushes, queue_push, queue_push_to_user
+)
+from app.rate_limit import prune_rate_limit_buckets
+from app.revocation import sync_revocations
+from app.config import settings
+from app.utils_time import get_zone, next_fire_at, occurrence_on
 
-NEPAL_TZ = ZoneInfo("Asia/Kathmandu")
+"""
+Background jobs: medicine reminders and their follow-ups, low-inventory
+alerts, the file deletion outbox, token revocation sync, push outbox
+dispatch and FCM token pruning.
+
+Reminders are driven by `ScheduleTime.next_fire_at`, the UTC instant of each
+schedule time's next occurrence in its owner's timezone. `ReminderLoop`
+sleeps until the earliest upcoming instant; then a tick claims all due rows
+with one indexed range query (FOR UPDATE SKIP LOCKED, so several
+workers never send the same reminder), records the reminders and advances
+each row to its following occurrence; the reminders' pushes are written to
+the push outbox (`app.push_dispatch`) in the same transaction and the tick
+wakes the dispatcher job to send them right away.
+`next_fire_at` is only recomputed when a time is created or edited, when the
+user changes timezone (`reschedule_user_times`) and when it fires - at which
+point the zone's current DST rules are applied again.
+"""
 
 scheduler = BackgroundScheduler()
 
-def check_and_send_reminders():
+REMINDER_RETRY_SECONDS = 5  # a failed reminder tick is tried again this much later
+
+
+class ReminderLoop:
     """
-    Periodically checks medicine schedules and inventory.
-    All times are strictly Nepal local time.
+    Event-driven reminder driver. Keeps a min-heap of upcoming `next_fire_at`
+    instants and sleeps until the earliest one, so reminders go out on time
+    and idle periods cost no queries. Fired rows push their next instants
+    back; the schedules endpoints push theirs through `notify`. The heap is
+    rebuilt from the table every `settings.reminder_resync_seconds` as a
+    safety net (changes made through another worker, backfilled rows).
+    """
+
+    def __init__(self):
+        self._heap: List[float] = []
+        self._queued: Set[float] = set()
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._resync_at = 0.0
+
+    def notify(self, instants: Iterable[datetime]):
+        """
+        Hook: reminders are due at `instants` (new or changed schedule times).
+        """
+        with self._wakeup:
+            for instant in instants:
+                at = instant.timestamp()
+                if at not in self._queued:
+                    self._queued.add(at)
+                    heapq.heappush(self._heap, at)
+            self._wakeup.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="reminder-loop", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            action = self._next_action()
+            if action is None:
+                return
+            try:
+                if action == "resync":
+                    self._resync()
+                else:
+                    self.notify(send_due_reminders())
+            except Exception as e:
+                print(f"[Scheduler ERROR] {e}")
+                if action == "fire":  # the due instants left the heap; retry well within the grace period
+                    self.notify([datetime.now(timezone.utc) + timedelta(seconds=REMINDER_RETRY_SECONDS)])
+
+    def _next_action(self) -> Optional[str]:
+        """
+        Sleep until the next instant is due (or a resync); None when stopping.
+        """
+        with self._wakeup:
+            while not self._stopping:
+                now = time.time()
+                if now >= self._resync_at:
+                    return "resync"
+                if self._heap and self._heap[0] <= now:
+                    while self._heap and self._heap[0] <= now:
+                        self._queued.discard(heapq.heappop(self._heap))
+                    return "fire"
+                timeout = self._resync_at - now
+                if self._heap:
+                    timeout = min(timeout, self._heap[0] - now)
+                self._wakeup.wait(timeout)
+            return None
+
+    def _resync(self):
+        db: Session = SessionLocal()
+        try:
+            _backfill_next_fire_times(db, datetime.now(timezone.utc))
+        finally:
+            db.close()
+        db = ReplicaSession()  # rows missed through replica lag are announced via notify() anyway
+        try:
+            instants = db.execute(
+                select(models.ScheduleTime.next_fire_at)
+                .where(models.ScheduleTime.next_fire_at.isnot(None))
+                .distinct()
+                .order_by(models.ScheduleTime.next_fire_at)
+                .limit(settings.reminder_heap_size)
+            ).scalars().all()
+        finally:
+            db.close()
+        with self._wakeup:
+            self._heap = sorted({instant.timestamp() for instant in instants})
+            self._queued = set(self._heap)
+            self._resync_at = time.time() + settings.reminder_resync_seconds
+
+
+reminder_loop = ReminderLoop()
+
+
+def check_and_send_reminders(now: Optional[datetime] = None):
+    """
+    Send due reminders and low-inventory alerts in one go (benchmarks / tests).
+    - `now`: override the current time.
     """
-    db: Session = SessionLocal()
     try:
-        now = datetime.now(NEPAL_TZ)
-        current_time = now.time().replace(second=0, microsecond=0)
+        send_due_reminders(now)
+    except Exception as e:
+        print(f"[Scheduler ERROR] {e}")
+    check_low_inventory()
 
-        print(f"[Scheduler] Checking reminders at Nepal time {now.isoformat()}")
+def send_due_reminders(now: Optional[datetime] = None) -> List[datetime]:
+    """
+    Send every reminder due at `now` (default: the current time). Returns the
+    next fire instants of the rows that were processed; database errors are
+    raised so the caller can retry.
+    """
+    db: Session = SessionLocal()
+    upcoming: List[datetime] = []
+    try:
+        now = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+        print(f"[Scheduler] Checking reminders at {now.isoformat()}")
+        _backfill_next_fire_times(db, now)
+        while _claim_due_reminders(db, now, upcoming) == settings.reminder_batch_size:
+            pass
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    _wake_push_dispatcher()  # don't wait for the dispatcher job's interval to send the reminders
+    return upcoming
 
-        # ---------- Schedule-based reminders ----------
-        schedules = db.query(models.MedicineSchedule).options(
-            selectinload(models.MedicineSchedule.times),
-            selectinload(models.MedicineSchedule.medicine)
-        ).all()
+def _wake_push_dispatcher():
+    """
+    Run the push dispatcher job now rather than at its next interval, so the
+    caller never waits for the outbox to drain. Without a running scheduler
+    (benchmarks / tests) the outbox is dispatched inline.
+    """
+    if scheduler.running:
+        scheduler.modify_job("push_dispatch_job", next_run_time=datetime.now(timezone.utc))
+    else:
+        dispatch_pushes()
 
-        for schedule in schedules:
-            medicine = schedule.medicine
-            if not medicine:
-                continue
+def check_low_inventory():
+    """
+    Periodically alert users about medicines at or below their low threshold (once per medicine).
+    The scan runs on a read replica; each candidate is re-checked on the primary.
+    """
+    replica: Session = ReplicaSession()
+    try:
+        low_ids = replica.execute(
+            select(models.Medicine.id).where(
+                models.Medicine.inventory.isnot(None),
+                models.Medicine.low_threshold.isnot(None),
+                models.Medicine.inventory <= models.Medicine.low_threshold,
+                ~exists().where(
+                    models.Notification.related_entity_type == "medicine",
+                    models.Notification.related_entity_id == models.Medicine.id,
+                    models.Notification.notification_type == "inventory"
+                )
+            )
+        ).scalars().all()
+    except Exception as e:
+        print(f"[Scheduler ERROR] {e}")
+        return
+    finally:
+        replica.close()
+    if not low_ids:
+        return
 
-            for st in schedule.times:
-                tod = st.time_of_day
-
-                if tod.hour == current_time.hour and tod.minute == current_time.minute:
-                    # Check for existing reminder for this medicine at this time
-                    existing_reminder = db.query(models.Notification).filter(
-                        models.Notification.related_entity_type == "medicine",
-                        models.Notification.related_entity_id == medicine.id,
-                        models.Notification.notification_type == "reminder",
-                        models.Notification.created_at >= datetime(
-                            now.year, now.month, now.day, tod.hour, tod.minute, 0, tzinfo=NEPAL_TZ
-                        )
-                    ).first()
-
-                    if existing_reminder:
-                        continue  # Skip creating duplicate
-
-                    title = f"Time to take {medicine.name}"
-                    message = f"Please take {medicine.name} ({medicine.dosage or 'dose'}) now."
-                    notif = models.Notification(
-                        user_id=medicine.user_id,
-                        title=title,
-                        message=message,
-                        notification_type="reminder",
-                        related_entity_type="medicine",
-                        related_entity_id=medicine.id
-                    )
-                    db.add(notif)
-                    db.commit()
-
-                    user = db.query(models.User).filter(models.User.id == medicine.user_id).first()
-                    if user:
-                        for token_obj in user.fcm_tokens:
-                            send_push_notification(token_obj.fcm_token, title, message)
-                    print(f"[Scheduler] Reminder created for user {medicine.user_id} - medicine {medicine.name}")
-
-        # ---------- Low-inventory check ----------
+    db: Session = SessionLocal()
+    try:
         low_meds = db.query(models.Medicine).filter(
-            models.Medicine.inventory.isnot(None),
-            models.Medicine.low_threshold.isnot(None),
+            models.Medicine.id.in_(low_ids),
             models.Medicine.inventory <= models.Medicine.low_threshold
         ).all()
 
@@ -98,12 +245,8 @@ def check_and_send_reminders():
                 related_entity_id=medicine.id
             )
             db.add(notif)
+            queue_push_to_user(db, medicine.user_id, title, message, PRIORITY_INVENTORY, notif)
             db.commit()
-
-            user = db.query(models.User).filter(models.User.id == medicine.user_id).first()
-            if user:
-                for token_obj in user.fcm_tokens:
-                    send_push_notification(token_obj.fcm_token, title, message)
             print(f"[Scheduler] Low inventory alert for medicine {medicine.name} (user {medicine.user_id})")
 
     except Exception as e:
@@ -112,16 +255,192 @@ def check_and_send_reminders():
     finally:
         db.close()
 
+def _claim_due_reminders(db: Session, now: datetime, upcoming: List[datetime]) -> int:
+    """
+    Claim one batch of due schedule times, record their reminders with their
+    pushes (outbox rows) and follow-ups in the same transaction, and advance
+    them to their next occurrence (appended to `upcoming`). Returns the
+    number claimed.
+    """
+    due = db.execute(
+        select(
+            models.ScheduleTime.id,
+            models.ScheduleTime.time_of_day,
+            models.ScheduleTime.next_fire_at,
+            models.Medicine.id.label("medicine_id"),
+            models.Medicine.user_id,
+            models.Medicine.name,
+            models.Medicine.dosage,
+            models.User.timezone,
+        )
+        .join(models.MedicineSchedule, models.MedicineSchedule.id == models.ScheduleTime.schedule_id)
+        .join(models.Medicine, models.Medicine.id == models.MedicineSchedule.medicine_id)
+        .join(models.User, models.User.id == models.Medicine.user_id)
+        .where(models.ScheduleTime.next_fire_at <= now)
+        .order_by(models.ScheduleTime.next_fire_at)
+        .limit(settings.reminder_batch_size)
+        .with_for_update(of=models.ScheduleTime, skip_locked=True)
+    ).all()
+    if not due:
+        return 0
+
+    grace = timedelta(seconds=settings.reminder_grace_seconds)
+    advanced = []
+    reminders: Dict[tuple, models.Notification] = {}
+    names: Dict[int, str] = {}
+    for row in due:
+        zone = get_zone(row.timezone)
+        # Recompute the occurrence with today's rules: if the zone's offset
+        # changed since it was scheduled, it may not be due after all
+        expected = occurrence_on(row.time_of_day, zone, row.next_fire_at.astimezone(zone).date())
+        if expected > now:
+            advanced.append({"id": row.id, "next_fire_at": expected})
+            continue
+        advanced.append({"id": row.id, "next_fire_at": next_fire_at(row.time_of_day, zone, now)})
+        if now - expected > grace:
+            continue  # missed while the scheduler was down; don't send stale reminders
+
+        # One reminder per medicine and minute, even if several schedules share the time
+        key = (row.medicine_id, expected.replace(second=0, microsecond=0))
+        if key in reminders:
+            continue
+        names[row.medicine_id] = row.name
+        reminders[key] = models.Notification(
+            user_id=row.user_id,
+            title=f"Time to take {row.name}",
+            message=f"Please take {row.name} ({row.dosage or 'dose'}) now.",
+            notification_type="reminder",
+            related_entity_type="medicine",
+            related_entity_id=row.medicine_id
+        )
+
+    tokens: Dict[int, List[str]] = {}
+    user_ids = {notif.user_id for notif in reminders.values()}
+    if user_ids:
+        for user_id, token in db.execute(
+            select(models.UserFCMToken.user_id, models.UserFCMToken.fcm_token)
+            .where(models.UserFCMToken.user_id.in_(user_ids), live_token())
+        ):
+            tokens.setdefault(user_id, []).append(token)
+
+    db.execute(update(models.ScheduleTime), advanced)
+    for notif in reminders.values():
+        db.add(notif)
+        name = names[notif.related_entity_id]
+        for token in tokens.get(notif.user_id, []):
+            queue_push(db, token, notif.title, notif.message, PRIORITY_REMINDER, notif, subject=name)
+        print(f"[Scheduler] Reminder created for user {notif.user_id} - medicine {name}")
+    schedule_followups(db, [
+        (notif.user_id, medicine_id, slot_at) for (medicine_id, slot_at), notif in reminders.items()
+    ])
+    db.commit()
+    upcoming.extend(item["next_fire_at"] for item in advanced)
+    return len(due)
+
+
+def _backfill_next_fire_times(db: Session, now: datetime):
+    """
+    Compute `next_fire_at` for schedule times created before it existed.
+    """
+    while True:
+        rows = db.execute(
+            select(models.ScheduleTime.id, models.ScheduleTime.time_of_day, models.User.timezone)
+            .join(models.MedicineSchedule, models.MedicineSchedule.id == models.ScheduleTime.schedule_id)
+            .join(models.Medicine, models.Medicine.id == models.MedicineSchedule.medicine_id)
+            .join(models.User, models.User.id == models.Medicine.user_id)
+            .where(models.ScheduleTime.next_fire_at.is_(None))
+            .limit(settings.reminder_batch_size)
+        ).all()
+        if not rows:
+            return
+        db.execute(update(models.ScheduleTime), [
+            {"id": row.id, "next_fire_at": next_fire_at(row.time_of_day, get_zone(row.timezone), now)}
+            for row in rows
+        ])
+        db.commit()
+        print(f"[Scheduler] Backfilled next fire time of {len(rows)} schedule times")
+
+def reschedule_user_times(db: Session, user_id: int, zone_name: str, now: Optional[datetime] = None):
+    """
+    Recompute `next_fire_at` of all the user's schedule times for `zone_name`
+    (after a timezone change) and tell the reminder loop. The caller commits.
+    """
+    zone = get_zone(zone_name)
+    now = now or datetime.now(timezone.utc)
+    rows = db.execute(
+        select(models.ScheduleTime.id, models.ScheduleTime.time_of_day)
+        .join(models.MedicineSchedule, models.MedicineSchedule.id == models.ScheduleTime.schedule_id)
+        .join(models.Medicine, models.Medicine.id == models.MedicineSchedule.medicine_id)
+        .where(models.Medicine.user_id == user_id)
+    ).all()
+    if rows:
+        advanced = [{"id": row.id, "next_fire_at": next_fire_at(row.time_of_day, zone, now)} for row in rows]
+        db.execute(update(models.ScheduleTime), advanced)
+        reminder_loop.notify(item["next_fire_at"] for item in advanced)
+
 def start_scheduler():
     """
-    Start background scheduler (Nepal time, every 60 seconds).
+    Start background jobs: the reminder loop, low-inventory alerts (every
+    60 seconds), the file deletion outbox worker, the token revocation sync, the push outbox
+    dispatcher and its hourly purge of parked pushes, follow-up reminders, FCM token pruning
+    and pruning of idle shared rate limit buckets.
     """
     scheduler.add_job(
-        check_and_send_reminders,
+        check_low_inventory,
         "interval",
         seconds=60,
-        id="reminder_job",
+        id="inventory_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        process_file_deletions,
+        "interval",
+        seconds=settings.file_deletion_interval_seconds,
+        id="file_deletion_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        sync_revocations,
+        "interval",
+        seconds=settings.revocation_sync_seconds,
+        id="revocation_sync_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        dispatch_pushes,
+        "interval",
+        seconds=settings.push_dispatch_interval_seconds,
+        id="push_dispatch_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        purge_parked_pushes,
+        "interval",
+        hours=1,
+        id="push_purge_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        fire_due_followups,
+        "interval",
+        seconds=settings.followup_tick_seconds,
+        id="followup_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        prune_rate_limit_buckets,
+        "interval",
+        hours=1,
+        id="rate_limit_prune_job",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        prune_fcm_tokens,
+        "interval",
+        minutes=settings.fcm_token_prune_minutes,
+        id="fcm_token_prune_job",
         replace_existing=True
     )
     scheduler.start()
-    print("[Scheduler] Started (Nepal time)")
+    reminder_loop.start()
+    print("[Scheduler] Started")
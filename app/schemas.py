@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, HttpUrl, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime, time
+from uuid import UUID
 
 """
 Pydantic schemas for request and response models.
@@ -13,10 +14,16 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str = Field(..., description="User password")
+    timezone: Optional[str] = Field(None, description="IANA timezone for schedule times (default Asia/Kathmandu)")
+
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = Field(None, description="Full name of the user")
+    timezone: Optional[str] = Field(None, description="IANA timezone, e.g. 'Asia/Kathmandu' or 'Europe/London'")
 
 class UserOut(UserBase):
     id: int = Field(..., description="User ID")
     is_active: bool = Field(..., description="Is the user account active?")
+    timezone: str = Field(..., description="IANA timezone schedule times are interpreted in")
 
     class Config:
         from_attributes = True
@@ -32,11 +39,21 @@ class Hospital(BaseModel):
     ambulance_driver_phone: List[str] = Field(..., description="Phone numbers of ambulance drivers")
     ambulance_driver_address: List[str] = Field(..., description="Addresses of ambulance drivers")
     image_url: HttpUrl = Field(..., description="URL of hospital image or logo")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Latitude in decimal degrees")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Longitude in decimal degrees")
+
+class HospitalNearby(Hospital):
+    distance_km: float = Field(..., description="Great-circle distance from the given point in kilometres")
 
 # ---------- Auth / Token ----------
 class Token(BaseModel):
     access_token: str = Field(..., description="JWT access token")
     token_type: str = Field(..., description="Token type (e.g. 'bearer')")
+    refresh_token: Optional[str] = Field(None, description="Long-lived token for POST /token/refresh (single use)")
+    expires_in: Optional[int] = Field(None, description="Access token lifetime in seconds")
+
+class TokenRefresh(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token from /login or a previous refresh")
 
 class TokenData(BaseModel):
     id: Optional[int] = Field(None, description="ID of the user from token")
@@ -120,6 +137,19 @@ class MedicineIntakeWithMedicineOut(MedicineIntakeOut):
     class Config:
         from_attributes = True
 
+class MedicineIntakeBatchItem(BaseModel):
+    medicine_id: int = Field(..., description="ID of the medicine taken")
+    taken_at: Optional[datetime] = Field(None, description="When the medicine was taken (naive values are the user's local time; defaults to now)")
+    client_uuid: UUID = Field(..., description="Client-generated UUID used to deduplicate replays")
+
+class MedicineIntakeBatchCreate(BaseModel):
+    intakes: List[MedicineIntakeBatchItem] = Field(..., max_length=500, description="Intakes queued on the device (max 500 per request)")
+
+class MedicineIntakeBatchResult(BaseModel):
+    client_uuid: UUID = Field(..., description="Client UUID of the submitted intake")
+    status: str = Field(..., description="'created', 'duplicate' (already synced) or 'not_found' (medicine missing or not owned)")
+    intake: Optional[MedicineIntakeOut] = Field(None, description="Created intake log (only when status is 'created')")
+
 # ---------- Notifications ----------
 class NotificationBase(BaseModel):
     title: str = Field(..., description="Notification title")
@@ -143,12 +173,36 @@ class NotificationOut(NotificationBase):
 class NotificationUpdate(BaseModel):
     is_read: Optional[bool] = Field(None, description="Set to true to mark notification as read, false for unread")
 
+class NotificationTypeStats(BaseModel):
+    total: int
+    unread: int
+
+class NotificationStats(BaseModel):
+    total: int = Field(..., description="Total notifications")
+    unread: int = Field(..., description="Unread notifications")
+    by_type: Dict[str, NotificationTypeStats] = Field(..., description="Counts per notification type")
+
+# ---------- Dashboard ----------
+class DashboardOut(BaseModel):
+    user: UserOut
+    medicines: List[MedicineOut]
+    schedules: List[MedicineScheduleWithMedicineOut]
+    notification_stats: NotificationStats
+    unread_notifications: List[NotificationOut] = Field(..., description="Newest unread notifications")
+
 class MedicalRecordOut(BaseModel):
     id: int
     title: str
     file_url: str
     file_type: str
     uploaded_at: datetime
+    size_bytes: Optional[int] = Field(None, description="File size in bytes")
+    width: Optional[int] = Field(None, description="Image width in pixels, if known")
+    height: Optional[int] = Field(None, description="Image height in pixels, if known")
+    thumbnail_url: Optional[str] = Field(None, description="Small square thumbnail for lists")
+    preview_url: Optional[str] = Field(None, description="Reduced-size preview image")
+    signed_url: Optional[str] = Field(None, description="Short-lived signed URL of the original file")
+    signed_url_expires_at: Optional[datetime] = Field(None, description="When signed_url stops working")
 
     class Config:
         from_attributes = True
@@ -160,6 +214,11 @@ class Pharmacy(BaseModel):
     pharmacists: List[str] = Field(..., description="List of pharmacist names")
     open_hours: Optional[str] = Field(None, description="Opening hours")
     image_url: Optional[str] = Field(None, description="Image URL of the pharmacy")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Latitude in decimal degrees")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Longitude in decimal degrees")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PharmacyNearby(Pharmacy):
+    distance_km: float = Field(..., description="Great-circle distance from the given point in kilometres")
\ No newline at end of file
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set
+
+"""
+In-memory search over the static hospital / pharmacy directories.
+
+Every record's searchable fields are lowercased once and indexed by their
+character n-grams (1 to 3 characters, spaces included), so a substring query
+only has to intersect a few posting lists and verify the surviving candidates
+instead of scanning and re-lowercasing the whole directory per request.
+"""
+
+MAX_GRAM = 3
+
+
+def _grams(text: str, n: int) -> Set[str]:
+    """
+    Return the set of character n-grams of length `n` in `text`.
+    """
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """
+    Substring/prefix search index over a list of dict records.
+
+    Matching is case-insensitive and has the same semantics as
+    `query.lower() in record[field].lower()` for any of `fields`.
+    Results are ranked: name exact > name prefix > word prefix in name >
+    name substring > address matches, then by original directory order.
+    """
+
+    def __init__(self, records: Sequence[dict], fields: Sequence[str] = ("name", "address")):
+        self.records = list(records)
+        self.fields = tuple(fields)
+        # Lowercased field values, precomputed once: lowered[record_idx][field_idx]
+        self.lowered = [
+            tuple((record.get(field) or "").lower() for field in self.fields)
+            for record in self.records
+        ]
+        # n-gram -> record indexes containing it in any field
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        for idx, values in enumerate(self.lowered):
+            for value in values:
+                for n in range(1, MAX_GRAM + 1):
+                    for gram in _grams(value, n):
+                        self.postings[gram].add(idx)
+
+    def _candidates(self, query: str) -> Set[int]:
+        """
+        Records containing every n-gram of the query (a superset of the matches).
+        """
+        n = min(len(query), MAX_GRAM)
+        # Smallest posting lists first so the intersection shrinks quickly
+        lists = sorted((self.postings.get(gram, set()) for gram in _grams(query, n)), key=len)
+        if not lists or not lists[0]:
+            return set()
+        result = set(lists[0])
+        for posting in lists[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def _rank(self, idx: int, query: str) -> Optional[int]:
+        """
+        Rank of a candidate record (lower is better), or None if it does not match.
+        """
+        name, *others = self.lowered[idx]
+        if name == query:
+            return 0
+        if name.startswith(query):
+            return 1
+        pos = name.find(query)
+        if pos > 0:
+            return 2 if name[pos - 1] == " " else 3
+        for value in others:
+            if value.startswith(query):
+                return 4
+            if query in value:
+                return 5
+        return None
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[dict]:
+        """
+        Return records matching `query`, best matches first, at most `limit` of them.
+        """
+        query = query.lower()
+        if not query:
+            return self.records[:limit]
+
+        ranked = []
+        for idx in self._candidates(query):
+            rank = self._rank(idx, query)
+            if rank is not None:
+                ranked.append((rank, idx))
+        ranked.sort()
+        return [self.records[idx] for _, idx in ranked[:limit]]
@@ -0,0 +1,106 @@
+import asyncio
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+"""
+Startup profiling.
+
+`StartupProfile` times the import of `app.main` and each lifespan step
+(independent steps run in parallel worker threads) and prints a report. A
+failing step is logged instead of aborting startup, so a replica still comes
+up (and reports unhealthy dependencies) when e.g. Firebase is unreachable.
+
+Run `python -m app.startup` to get a per-module import-time breakdown of
+`app.main` (via `python -X importtime`); it exits non-zero when the import
+exceeds `settings.startup_import_budget_ms`, so it can gate CI.
+"""
+
+
+class StartupProfile:
+    """Collects timings of startup steps."""
+
+    def __init__(self):
+        self.steps: List[Tuple[str, float, Optional[str]]] = []  # (name, seconds, error)
+
+    def record(self, name: str, seconds: float, error: Optional[str] = None):
+        self.steps.append((name, seconds, error))
+
+    def run(self, name: str, func: Callable[[], object]):
+        """
+        Run and time one blocking step; errors are recorded, not raised.
+        """
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            self.record(name, time.perf_counter() - started, (str(e).splitlines() or [repr(e)])[0])
+        else:
+            self.record(name, time.perf_counter() - started)
+
+    async def run_parallel(self, steps: Dict[str, Callable[[], object]]):
+        """
+        Run independent blocking steps concurrently in worker threads.
+        """
+        await asyncio.gather(*(
+            asyncio.to_thread(self.run, name, func) for name, func in steps.items()
+        ))
+
+    def report(self) -> str:
+        lines = ["[Startup] Profile:"]
+        for name, seconds, error in self.steps:
+            status = f"FAILED: {error}" if error else "ok"
+            lines.append(f"[Startup]   {name:<24} {seconds * 1000:8.1f} ms  {status}")
+        return "\n".join(lines)
+
+
+def import_time_breakdown(module: str = "app.main", top: int = 15) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Import `module` in a fresh interpreter with -X importtime.
+    Returns (total_ms, [(module, cumulative_ms), ...]) for the slowest direct imports.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+
+    # Children are printed before their parent, one indent level deeper
+    total_ms = 0.0
+    children, entries = [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        ms = int(cumulative) / 1000
+        if depth == 1:
+            children.append((name.strip(), ms))
+        elif depth == 0:
+            if name.strip() == module:
+                total_ms, entries = ms, children
+            children = []
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    return total_ms, entries[:top]
+
+
+def main() -> int:
+    total_ms, entries = import_time_breakdown()
+    budget = settings.startup_import_budget_ms
+    print(f"import app.main: {total_ms:.1f} ms (budget {budget} ms)")
+    for name, ms in entries:
+        print(f"  {ms:8.1f} ms  {name}")
+    if total_ms > budget:
+        print("Import-time budget exceeded")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import hashlib
+import hmac
+import shutil
+import struct
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from cachetools import TTLCache
+
+from app.config import settings
+
+"""
+Pluggable storage for uploaded medical files.
+
+- CloudinaryStorage: production backend (used when Cloudinary keys are set).
+- LocalStorage: writes files under `settings.local_storage_dir` and serves them
+  from `settings.local_storage_url`; meant for development and tests.
+
+Backends are synchronous; callers run them off the event loop.
+
+Delivery URLs (thumbnail, preview and a short-lived signed URL for the
+original) are computed locally from the stored public id and cached per
+record for most of their lifetime, so listing records costs no network calls.
+"""
+
+
+@dataclass
+class StoredFile:
+    """Result of storing a file."""
+    public_id: str
+    url: str
+    file_type: str
+    size_bytes: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class DeliveryUrls:
+    """URLs handed to clients for one stored file."""
+    thumbnail_url: str
+    preview_url: str
+    signed_url: str
+    expires_at: Optional[int] = None  # unix timestamp after which signed_url stops working
+
+
+class StorageBackend(ABC):
+    """Interface implemented by storage backends."""
+    name = "base"
+    signed_only = False  # stored URLs can't be fetched as-is; clients get the signed URL instead
+
+    @abstractmethod
+    def upload(self, source: BinaryIO, filename: str, content_type: str) -> StoredFile:
+        ...
+
+    @abstractmethod
+    def delete(self, public_id: str) -> bool:
+        ...
+
+    def delete_many(self, public_ids: List[str]) -> Dict[str, bool]:
+        """Delete several files; returns success per public_id."""
+        return {public_id: self.delete(public_id) for public_id in public_ids}
+
+    @abstractmethod
+    def delivery_urls(self, public_id: str, file_type: str, expires_at: int) -> DeliveryUrls:
+        ...
+
+
+class CloudinaryStorage(StorageBackend):
+    """Stores files in Cloudinary under carezio/medical_records."""
+    name = "cloudinary"
+
+    def upload(self, source: BinaryIO, filename: str, content_type: str) -> StoredFile:
+        from app.cloudinary import upload_medical_file
+
+        result = upload_medical_file(source)
+        return StoredFile(
+            public_id=result.get("public_id"),
+            url=result.get("secure_url"),
+            file_type=result.get("format", "unknown"),
+            size_bytes=result.get("bytes"),
+            width=result.get("width"),
+            height=result.get("height"),
+        )
+
+    def delete(self, public_id: str) -> bool:
+        from app.cloudinary import delete_medical_file
+
+        return delete_medical_file(public_id)
+
+    def delete_many(self, public_ids: List[str]) -> Dict[str, bool]:
+        from app.cloudinary import delete_medical_files
+
+        results = {}
+        for i in range(0, len(public_ids), 100):  # Admin API limit per call
+            results.update(delete_medical_files(public_ids[i:i + 100]))
+        return results
+
+    def delivery_urls(self, public_id: str, file_type: str, expires_at: int) -> DeliveryUrls:
+        from app.cloudinary import medical_file_urls
+
+        thumbnail_url, preview_url, signed_url = medical_file_urls(
+            public_id, file_type, expires_at, settings.thumbnail_size, settings.preview_width
+        )
+        return DeliveryUrls(thumbnail_url, preview_url, signed_url, expires_at)
+
+
+class LocalStorage(StorageBackend):
+    """Stores files on the local filesystem."""
+    name = "local"
+    signed_only = True
+
+    def __init__(self, root: Path, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, source: BinaryIO, filename: str, content_type: str) -> StoredFile:
+        ext = Path(filename or "").suffix.lower().lstrip(".") or content_type.rsplit("/", 1)[-1]
+        public_id = f"medical_records/{uuid.uuid4().hex}.{ext}"
+        path = self.root / public_id
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(source, out)
+        width, height = _image_dimensions(path)
+        return StoredFile(
+            public_id=public_id,
+            url=f"{self.base_url}/{public_id}",
+            file_type=ext,
+            size_bytes=path.stat().st_size,
+            width=width,
+            height=height,
+        )
+
+    def delete(self, public_id: str) -> bool:
+        path = (self.root / public_id).resolve()
+        if self.root.resolve() not in path.parents:
+            return False
+        path.unlink(missing_ok=True)
+        return True
+
+    def _signature(self, public_id: str, expires_at: int) -> str:
+        message = f"{public_id}:{expires_at}".encode("utf-8")
+        return hmac.new(settings.secret_key.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+    def delivery_urls(self, public_id: str, file_type: str, expires_at: int) -> DeliveryUrls:
+        # No image transformations locally: thumbnail and preview point at the original
+        query = urlencode({"expires": expires_at, "signature": self._signature(public_id, expires_at)})
+        url = f"{self.base_url}/{public_id}?{query}"
+        return DeliveryUrls(url, url, url, expires_at)
+
+    def verify(self, public_id: str, expires_at: int, signature: str) -> bool:
+        """
+        Check a signed local URL.
+        """
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(public_id, expires_at), signature)
+
+
+def _image_dimensions(path: Path) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Read width/height from a PNG or JPEG header; (None, None) for anything else.
+    """
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+        if head[:2] != b"\xff\xd8":
+            return None, None
+        # Walk JPEG segments until a start-of-frame marker
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None, None
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None, None
+            if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None, None
+                height, width = struct.unpack(">HH", frame[1:5])
+                return width, height
+            f.seek(struct.unpack(">H", length_bytes)[0] - 2, 1)
+
+
+def cloudinary_configured() -> bool:
+    """
+    True if all Cloudinary credentials are set.
+    """
+    return all([settings.cloudinary_cloud_name, settings.cloudinary_api_key, settings.cloudinary_api_secret])
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    """
+    Return the configured storage backend. Without an explicit
+    `settings.storage_backend`, Cloudinary is used when configured, else local disk.
+    """
+    backend = settings.storage_backend or ("cloudinary" if cloudinary_configured() else "local")
+    if backend == "cloudinary":
+        return CloudinaryStorage()
+    if backend == "local":
+        return LocalStorage(Path(settings.local_storage_dir), settings.local_storage_url)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# (record id, public_id) -> DeliveryUrls; entries are dropped well before their signed URLs expire
+_url_cache: Optional[TTLCache] = None
+_url_cache_lock = threading.Lock()  # TTLCache isn't thread-safe and sync routes run in the threadpool
+
+
+def delivery_urls_for(record_id: int, public_id: Optional[str], file_type: str, fallback_url: str) -> DeliveryUrls:
+    """
+    Delivery URLs for a medical record, cached per record until shortly before expiry.
+    Legacy records without a public_id get their stored URL for everything.
+    """
+    global _url_cache
+    if not public_id:
+        return DeliveryUrls(fallback_url, fallback_url, fallback_url, None)
+    key = (record_id, public_id)
+    with _url_cache_lock:
+        if _url_cache is None:
+            # Re-sign once 3/4 of the lifetime has passed so clients always get a usable URL
+            _url_cache = TTLCache(maxsize=10000, ttl=settings.signed_url_ttl_seconds * 3 / 4)
+        urls = _url_cache.get(key)
+    if urls is None:
+        expires_at = int(time.time()) + settings.signed_url_ttl_seconds
+        urls = get_storage().delivery_urls(public_id, file_type, expires_at)
+        with _url_cache_lock:
+            _url_cache[key] = urls
+    return urls
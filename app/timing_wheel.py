@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+"""
+Hierarchical timing wheel (Varghese & Lauck).
+
+Level 0 has `slots` buckets of one tick (`resolution` seconds); each higher
+level has `slots` buckets spanning one full turn of the level below. A timer
+is placed on the lowest level whose span covers its delay and cascades down
+as its bucket comes up, so scheduling, cancelling (by key) and expiring a
+timer are all O(1) no matter how many are pending. Timers beyond the top
+level wait in an overflow bucket.
+"""
+
+
+class TimingWheel:
+    """
+    Timers keyed by any hashable key; `advance(now)` returns the expired ones.
+    """
+
+    def __init__(self, now: float, resolution: float = 1.0, slots: int = 64, levels: int = 3):
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self._tick = int(now // resolution)
+        self._wheels: List[List[Dict[Hashable, Tuple[int, object]]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        self._overflow: Dict[Hashable, Tuple[int, object]] = {}
+        self._locations: Dict[Hashable, Dict[Hashable, Tuple[int, object]]] = {}  # key -> its bucket
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def schedule(self, key: Hashable, when: float, payload: object = None):
+        """
+        Fire `key` at `when` (same clock as `advance`); replaces an existing timer with the same key.
+        """
+        with self._lock:
+            self._remove(key)
+            # Already due: fire on the next advance rather than a full turn later
+            self._place(key, max(int(when // self.resolution), self._tick + 1), payload)
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def advance(self, now: float) -> List[Tuple[Hashable, object]]:
+        """
+        Move the wheel to `now`; returns (key, payload) of every timer that expired.
+        """
+        expired = []
+        target = int(now // self.resolution)
+        with self._lock:
+            while self._tick < target:
+                self._tick += 1
+                self._cascade()
+                bucket = self._wheels[0][self._tick % self.slots]
+                for key in [key for key, (tick, _) in bucket.items() if tick <= self._tick]:
+                    expired.append((key, bucket.pop(key)[1]))
+                    del self._locations[key]
+        return expired
+
+    def _cascade(self):
+        """
+        Re-place the timers of higher-level buckets that come up at the current tick.
+        """
+        span = 1
+        for level in range(1, self.levels + 1):
+            span *= self.slots
+            if self._tick % span:
+                return
+            if level == self.levels:
+                bucket, self._overflow = self._overflow, {}
+            else:
+                slot = (self._tick // span) % self.slots
+                bucket = self._wheels[level][slot]
+                self._wheels[level][slot] = {}
+            for key, (tick, payload) in bucket.items():
+                self._place(key, tick, payload)
+
+    def _place(self, key: Hashable, tick: int, payload: object):
+        delta = tick - self._tick
+        span = 1
+        bucket: Optional[dict] = None
+        for level in range(self.levels):
+            if delta < span * self.slots:
+                bucket = self._wheels[level][(tick // span) % self.slots]
+                break
+            span *= self.slots
+        if bucket is None:
+            bucket = self._overflow
+        bucket[key] = (tick, payload)
+        self._locations[key] = bucket
+
+    def _remove(self, key: Hashable) -> bool:
+        bucket = self._locations.pop(key, None)
+        if bucket is None:
+            return False
+        del bucket[key]
+        return True
@@ -0,0 +1,166 @@
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+from typing import Dict, Iterable, Optional
+
+import anyio
+from fastapi import HTTPException, Request, UploadFile, status
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+
+from app.config import settings
+
+"""
+Streaming multipart parsing for file uploads.
+
+FastAPI's `UploadFile` parameters only reach the endpoint after the whole
+request body has been spooled. `read_multipart_upload` instead consumes the
+body chunk by chunk, rejects a disallowed content type as soon as the file
+part's headers arrive and aborts with 413 the moment the size limit is
+exceeded. File data goes to a spooled temp file (memory up to 1 MB, then disk
+writes in a worker thread), and uploads to the storage backend run in worker
+threads behind a shared concurrency limit.
+"""
+
+SPOOL_MAX_SIZE = 1024 * 1024
+MAX_FIELD_SIZE = 4 * 1024
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries, part headers and small fields
+
+_upload_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+@dataclass
+class MultipartUpload:
+    """Parsed multipart request: small text fields plus one streamed file."""
+    fields: Dict[str, str] = field(default_factory=dict)
+    file: Optional[UploadFile] = None
+
+
+class _Part:
+    def __init__(self):
+        self.header_field = b""
+        self.header_value = b""
+        self.headers = []
+        self.name = None
+        self.filename = None
+        self.content_type = None
+        self.data = bytearray()
+
+
+async def read_multipart_upload(
+    request: Request,
+    file_field: str,
+    allowed_types: Iterable[str],
+    max_bytes: int,
+) -> MultipartUpload:
+    """
+    Stream a multipart/form-data body with a single file part named `file_field`.
+    Raises 400 (malformed), 413 (too large) or 415 (disallowed content type).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+    allowed_types = set(allowed_types)
+    result = MultipartUpload()
+    state = {"part": None, "file_bytes": 0, "error": None}
+    pending = []  # file chunks to write after each parser.write()
+
+    def on_part_begin():
+        state["part"] = _Part()
+
+    def on_header_field(data, start, end):
+        state["part"].header_field += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["part"].header_value += data[start:end]
+
+    def on_header_end():
+        part = state["part"]
+        part.headers.append((part.header_field.lower(), part.header_value))
+        part.header_field = b""
+        part.header_value = b""
+
+    def on_headers_finished():
+        part = state["part"]
+        headers = dict(part.headers)
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        part.name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+            part.content_type = headers.get(b"content-type", b"").decode("latin-1")
+            if part.name != file_field or result.file is not None:
+                state["error"] = (400, "Unexpected file field")
+            elif part.content_type not in allowed_types:
+                state["error"] = (status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "File type not allowed")
+            else:
+                result.file = UploadFile(
+                    file=SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE),
+                    filename=part.filename,
+                    headers=Headers(raw=part.headers),
+                )
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        if part.filename is not None:
+            state["file_bytes"] += end - start
+            if state["file_bytes"] > max_bytes:
+                state["error"] = (status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "File too large")
+            else:
+                pending.append(data[start:end])
+        else:
+            part.data += data[start:end]
+            if len(part.data) > MAX_FIELD_SIZE:
+                state["error"] = (400, f"Field '{part.name}' too large")
+
+    def on_part_end():
+        part = state["part"]
+        if part.filename is None:
+            result.fields[part.name] = part.data.decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+            if state["error"]:
+                code, detail = state["error"]
+                raise HTTPException(status_code=code, detail=detail)
+            for data in pending:
+                await result.file.write(data)  # offloads to a thread once spooled to disk
+            pending.clear()
+        parser.finalize()
+    except BaseException:
+        if result.file is not None:
+            await result.file.close()
+        raise
+
+    if result.file is None:
+        raise HTTPException(status_code=400, detail=f"Missing file field '{file_field}'")
+    await result.file.seek(0)
+    return result
+
+
+async def run_upload(func, *args):
+    """
+    Run a blocking storage call in a worker thread, at most
+    `settings.upload_concurrency` at a time per process.
+    """
+    global _upload_limiter
+    if _upload_limiter is None:
+        _upload_limiter = anyio.CapacityLimiter(settings.upload_concurrency)
+    return await anyio.to_thread.run_sync(lambda: func(*args), limiter=_upload_limiter)
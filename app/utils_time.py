@@ -1,28 +1,71 @@
-from datetime import datetime, date, time as dt_time
-from zoneinfo import ZoneInfo
-from typing import Union
+from datetime import datetime, date, time as dt_time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Optional, Union
 
-NEPAL_TZ = ZoneInfo("Asia/Kathmandu")
+"""
+Time helpers.
 
-def local_time_to_nepal_timeobj(local_time: Union[str, dt_time]) -> dt_time:
+Schedule times (`ScheduleTime.time_of_day`) are wall-clock times in the
+owning user's timezone (`User.timezone`, an IANA name; Nepal by default).
+For the reminder engine each one is normalized to `next_fire_at`, the next
+UTC instant at which that wall-clock time occurs, computed by
+`next_fire_at()` with the zone's current rules.
+"""
+
+DEFAULT_TIMEZONE = "Asia/Kathmandu"
+NEPAL_TZ = ZoneInfo(DEFAULT_TIMEZONE)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """
+    ZoneInfo for an IANA timezone name (None means the default zone).
+    """
+    return ZoneInfo(name) if name else NEPAL_TZ
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        get_zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def parse_time_of_day(value: Union[str, dt_time]) -> dt_time:
     """
-    Convert a Nepal local time (string "HH:MM[:SS]" or time object)
-    to a Nepal time object.
+    Parse a wall-clock time (string "HH:MM[:SS]" or time object) into a naive time.
     """
-    if isinstance(local_time, str):
-        parts = [int(p) for p in local_time.split(":")]
-        h, m = parts[0], parts[1]
-        s = parts[2] if len(parts) > 2 else 0
-        local_time_obj = dt_time(h, m, s)
-    else:
-        local_time_obj = local_time
+    if isinstance(value, str):
+        parts = [int(p) for p in value.split(":")]
+        return dt_time(parts[0], parts[1], parts[2] if len(parts) > 2 else 0)
+    return value.replace(tzinfo=None)
 
-    # ensure tz-aware datetime is in Nepal TZ (if needed)
-    local_dt = datetime.combine(date.today(), local_time_obj, tzinfo=NEPAL_TZ)
-    return dt_time(local_dt.hour, local_dt.minute, local_dt.second)
 
-def nepal_time_to_str(time_obj: dt_time) -> str:
+def time_of_day_to_str(time_obj: dt_time) -> str:
     """
-    Convert a Nepal time object to string "HH:MM:SS".
+    Convert a time object to string "HH:MM:SS".
     """
     return time_obj.isoformat(timespec="seconds")
+
+
+def occurrence_on(time_of_day: dt_time, zone: ZoneInfo, local_date: date) -> datetime:
+    """
+    UTC instant at which the wall clock in `zone` shows `time_of_day` on `local_date`.
+    Times skipped by a DST jump map to the equivalent instant after the jump;
+    repeated times map to their first occurrence.
+    """
+    return datetime.combine(local_date, time_of_day, tzinfo=zone).astimezone(timezone.utc)
+
+
+def next_fire_at(time_of_day: dt_time, zone: ZoneInfo, after: datetime) -> datetime:
+    """
+    The first occurrence (UTC) of `time_of_day` in `zone` strictly after `after`.
+    """
+    local_date = after.astimezone(zone).date()
+    for days in (0, 1, 2):
+        candidate = occurrence_on(time_of_day, zone, local_date + timedelta(days=days))
+        if candidate > after:
+            return candidate
+    raise ValueError("no occurrence found")  # unreachable: a wall-clock time recurs daily
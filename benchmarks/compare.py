@@ -0,0 +1,49 @@
+import json
+import sys
+
+"""
+Compare two benchmark result files produced by `python -m benchmarks.run --out`.
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python -m benchmarks.compare BEFORE.json AFTER.json")
+        return 2
+    with open(argv[0]) as f:
+        before = json.load(f)
+    with open(argv[1]) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('commit')} ({before['meta'].get('dialect')}, {before['meta'].get('users')} users)")
+    print(f"after:  {after['meta'].get('commit')} ({after['meta'].get('dialect')}, {after['meta'].get('users')} users)")
+    for name, old in before["endpoints"].items():
+        new = after["endpoints"].get(name)
+        if not new:
+            continue
+        cells = "  ".join(
+            f"{metric} {old[metric]:9.2f} -> {new[metric]:9.2f} ({_change(old[metric], new[metric])})"
+            for metric in METRICS
+        )
+        print(f"{name:<20} {cells}")
+
+    old_tick, new_tick = before.get("reminder_tick", {}), after.get("reminder_tick", {})
+    if old_tick and new_tick:
+        print(f"{'reminder_tick':<20} duration_ms {old_tick['duration_ms']:9.2f} -> {new_tick['duration_ms']:9.2f} "
+              f"({_change(old_tick['duration_ms'], new_tick['duration_ms'])})  pushes {old_tick['pushes']} -> {new_tick['pushes']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+"""
+Load-test / benchmark harness.
+
+Seeds a PostgreSQL or SQLite database with synthetic data, drives the real
+FastAPI app in-process (httpx ASGI transport, no network or server) and
+reports p50/p95/p99 latency and throughput for the hot endpoints, plus the
+duration of a single reminder tick with a fake push transport. Results are
+written as JSON so runs on different commits can be compared:
+
+    python -m benchmarks.run --db-url postgresql://postgres@localhost/carezio_bench --users 1000 --out before.json
+    python -m benchmarks.run --db-url sqlite:///bench.db --users 1000 --reset --out after.json
+    python -m benchmarks.compare before.json after.json
+
+The database is created/extended in place; use a dedicated database and
+`--reset` to start from empty tables.
+"""
+
+ENDPOINTS = [
+    # (name, method, path)
+    ("login", "POST", "/login"),
+    ("schedules", "GET", "/schedules/"),
+    ("intakes", "GET", "/intakes/"),
+    ("notifications", "GET", "/notifications/"),
+    ("notification_stats", "GET", "/notifications/stats/overview"),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CareZio benchmark harness")
+    parser.add_argument("--db-url", default=os.environ.get("DATABASE_URL", "sqlite:///bench.db"),
+                        help="database to seed and benchmark (default: $DATABASE_URL or sqlite:///bench.db)")
+    parser.add_argument("--users", type=int, default=1000, help="synthetic users to seed (1k to 1M)")
+    parser.add_argument("--medicines-per-user", type=int, default=3)
+    parser.add_argument("--intakes-per-user", type=int, default=30)
+    parser.add_argument("--notifications-per-user", type=int, default=30)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--skip-seed", action="store_true", help="benchmark the existing data only")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--sample-users", type=int, default=50, help="distinct users issuing requests")
+    parser.add_argument("--tick-time", default="08:00", help="Nepal wall-clock minute of the reminder tick")
+    parser.add_argument("--out", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an ascending list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float, errors: int) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+async def drive(client, method: str, path: str, users: List[dict], total: int, concurrency: int, password: str):
+    """
+    Issue `total` requests spread over `users`; returns (latencies_ms, wall_seconds, errors).
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            user = users[i % len(users)]
+            started = time.perf_counter()
+            if method == "POST" and path == "/login":
+                response = await client.post(path, data={"username": user["email"], "password": password})
+            else:
+                response = await client.request(method, path, headers=user["headers"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, errors
+
+
+async def run_endpoints(app, users: List[dict], args, password: str) -> Dict[str, dict]:
+    import httpx
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, method, path in ENDPOINTS:
+            await drive(client, method, path, users, args.warmup, args.concurrency, password)
+            latencies, wall, errors = await drive(client, method, path, users, args.requests, args.concurrency, password)
+            results[name] = {"method": method, "path": path, **summarize(latencies, wall, errors)}
+            print(f"[Bench] {name:<20} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                  f"p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['throughput_rps']:8.1f} req/s  errors {errors}")
+    return results
+
+
+def run_reminder_tick(tick_time: str) -> Dict[str, float]:
+    """
+    Time one reminder tick at `tick_time` (Nepal) today, counting pushes instead of sending them.
+    """
+    from app.firebase import set_push_transport
+    from app.scheduler import check_and_send_reminders
+    from app.utils_time import NEPAL_TZ
+
+    pushes = {"count": 0}
+
+    def fake_transport(token, title, body):
+        pushes["count"] += 1
+        return "bench"
+
+    hour, minute = (int(part) for part in tick_time.split(":"))
+    now = datetime.now(NEPAL_TZ).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    set_push_transport(fake_transport)
+    try:
+        started = time.perf_counter()
+        check_and_send_reminders(now=now)
+        duration = time.perf_counter() - started
+    finally:
+        set_push_transport(None)
+    result = {"duration_ms": round(duration * 1000, 3), "pushes": pushes["count"]}
+    print(f"[Bench] reminder tick         {result['duration_ms']:8.2f} ms  pushes {result['pushes']}")
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # The app reads its database URL from settings at import time
+    os.environ["DATABASE_URL"] = args.db_url
+    # Measure the endpoints, not the rate limiter (all requests come from one client)
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from sqlalchemy import event, select
+
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from app.oauth2 import create_access_token
+    from benchmarks.seed import BENCH_PASSWORD, seed
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _sqlite_functions(dbapi_connection, connection_record):
+            # PostgreSQL's GREATEST, used by the intake endpoints
+            dbapi_connection.create_function("greatest", -1, max)
+
+    if args.reset:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    seeded = {}
+    seed_seconds = 0.0
+    if not args.skip_seed:
+        hour, minute = (int(part) for part in args.tick_time.split(":"))
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            seeded = seed(
+                db, args.users,
+                medicines_per_user=args.medicines_per_user,
+                intakes_per_user=args.intakes_per_user,
+                notifications_per_user=args.notifications_per_user,
+                due_time=datetime.min.time().replace(hour=hour, minute=minute),
+            )
+        finally:
+            db.close()
+        seed_seconds = time.perf_counter() - started
+        print(f"[Bench] Seeded {seeded} in {seed_seconds:.1f} s")
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.User.id, models.User.email).where(models.User.email.like("bench%"))
+        ).all()
+    finally:
+        db.close()
+    if not rows:
+        print("[Bench] No benchmark users found; run without --skip-seed first")
+        return 1
+    sample = random.Random(0).sample(rows, min(args.sample_users, len(rows)))
+    users = [
+        {"email": email, "headers": {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}}
+        for user_id, email in sample
+    ]
+
+    endpoints = asyncio.run(run_endpoints(app, users, args, BENCH_PASSWORD))
+    tick = run_reminder_tick(args.tick_time)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seeded": seeded,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "endpoints": endpoints,
+        "reminder_tick": tick,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[Bench] Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
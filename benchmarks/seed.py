@@ -0,0 +1,165 @@
+import random
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils import hash_password
+from app.utils_time import NEPAL_TZ, next_fire_at, occurrence_on
+
+"""
+Synthetic data for benchmarks.
+
+Rows are bulk-inserted with executemany-style Core inserts, one chunk of users
+at a time; every user shares one bcrypt hash (hashing per user would dominate
+seeding time).
+"""
+
+BENCH_PASSWORD = "bench-password"
+CHUNK = 5000  # rows per INSERT
+USERS_PER_CHUNK = 1000
+
+MEDICINE_NAMES = ["Paracetamol", "Metformin", "Amlodipine", "Atorvastatin", "Omeprazole", "Losartan", "Vitamin D", "Aspirin"]
+NOTIFICATION_TYPES = ["reminder", "inventory", "system"]
+
+
+def _bulk_insert(db: Session, model, rows: List[dict]):
+    for i in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[i:i + CHUNK])
+
+
+def seed(
+    db: Session,
+    users: int,
+    medicines_per_user: int = 3,
+    times_per_schedule: int = 2,
+    intakes_per_user: int = 30,
+    notifications_per_user: int = 30,
+    tokens_per_user: int = 1,
+    due_fraction: float = 0.05,
+    due_time: time = time(8, 0),
+    seed_value: int = 42,
+) -> Dict[str, int]:
+    """
+    Insert `users` synthetic users with medicines, one schedule per medicine,
+    intakes, notifications and FCM tokens. `due_fraction` of the schedule times
+    are set to `due_time` and every time is scheduled from just before
+    today's `due_time` (users are in the default Nepal zone), so a reminder
+    tick at that minute today has work to do.
+    Users are seeded in chunks so memory stays flat up to millions of rows.
+    Returns row counts per table.
+    """
+    rng = random.Random(seed_value)
+    password = hash_password(BENCH_PASSWORD)
+    run_tag = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")
+    counts: Dict[str, int] = {}
+    fire_after = occurrence_on(due_time, NEPAL_TZ, datetime.now(NEPAL_TZ).date()) - timedelta(minutes=1)
+    for start in range(0, users, USERS_PER_CHUNK):
+        chunk = range(start, min(users, start + USERS_PER_CHUNK))
+        for table, count in _seed_chunk(
+            db, rng, password, f"bench{run_tag}_{start}_", chunk,
+            medicines_per_user, times_per_schedule, intakes_per_user,
+            notifications_per_user, tokens_per_user, due_fraction, due_time, fire_after,
+        ).items():
+            counts[table] = counts.get(table, 0) + count
+        db.commit()
+    return counts
+
+
+def _seed_chunk(
+    db, rng, password, email_prefix, chunk,
+    medicines_per_user, times_per_schedule, intakes_per_user,
+    notifications_per_user, tokens_per_user, due_fraction, due_time, fire_after,
+) -> Dict[str, int]:
+    """
+    Seed one chunk of users and all their rows.
+    """
+    _bulk_insert(db, models.User, [
+        {"email": f"{email_prefix}{i}@example.com", "full_name": f"Bench User {i}", "password": password}
+        for i in chunk
+    ])
+    user_ids = db.execute(
+        select(models.User.id).where(models.User.email.like(f"{email_prefix}%"))
+    ).scalars().all()
+
+    _bulk_insert(db, models.UserFCMToken, [
+        {"user_id": uid, "fcm_token": f"bench-token-{uid}-{n}"}
+        for uid in user_ids for n in range(tokens_per_user)
+    ])
+
+    _bulk_insert(db, models.Medicine, [
+        {
+            "user_id": uid,
+            "name": rng.choice(MEDICINE_NAMES),
+            "dosage": f"{rng.choice([250, 500, 1000])} mg",
+            "inventory": rng.randint(0, 60),
+            "low_threshold": 5,
+        }
+        for uid in user_ids for _ in range(medicines_per_user)
+    ])
+    medicines = db.execute(
+        select(models.Medicine.id, models.Medicine.user_id).where(models.Medicine.user_id.in_(user_ids))
+    ).all()
+
+    _bulk_insert(db, models.MedicineSchedule, [
+        {"medicine_id": medicine_id, "frequency_type": "daily", "frequency_value": 1}
+        for medicine_id, _ in medicines
+    ])
+    schedule_ids = db.execute(
+        select(models.MedicineSchedule.id)
+        .where(models.MedicineSchedule.medicine_id.in_([medicine_id for medicine_id, _ in medicines]))
+    ).scalars().all()
+
+    times = []
+    for schedule_id in schedule_ids:
+        for _ in range(times_per_schedule):
+            if rng.random() < due_fraction:
+                tod = due_time
+            else:
+                tod = time(rng.randrange(24), rng.choice([0, 15, 30, 45]))
+            times.append({
+                "schedule_id": schedule_id,
+                "time_of_day": tod,
+                "next_fire_at": next_fire_at(tod, NEPAL_TZ, fire_after),
+            })
+    _bulk_insert(db, models.ScheduleTime, times)
+
+    now = datetime.now(timezone.utc)
+    by_user: Dict[int, List[int]] = {}
+    for medicine_id, user_id in medicines:
+        by_user.setdefault(user_id, []).append(medicine_id)
+    intakes = []
+    notifications = []
+    for uid in user_ids:
+        meds = by_user.get(uid) or []
+        for _ in range(intakes_per_user if meds else 0):
+            intakes.append({
+                "user_id": uid,
+                "medicine_id": rng.choice(meds),
+                "taken_at": now - timedelta(minutes=rng.randrange(60 * 24 * 365)),
+            })
+        for _ in range(notifications_per_user):
+            notifications.append({
+                "user_id": uid,
+                "title": "Bench notification",
+                "message": "Synthetic notification for benchmarks",
+                "notification_type": rng.choice(NOTIFICATION_TYPES),
+                "is_read": rng.random() < 0.7,
+                "related_entity_type": "medicine",
+                "related_entity_id": rng.choice(meds) if meds else None,
+                "created_at": now - timedelta(minutes=rng.randrange(60 * 24 * 90)),
+            })
+    _bulk_insert(db, models.MedicineIntakeLog, intakes)
+    _bulk_insert(db, models.Notification, notifications)
+
+    return {
+        "users": len(user_ids),
+        "user_fcm_tokens": len(user_ids) * tokens_per_user,
+        "medicines": len(medicines),
+        "medicine_schedules": len(schedule_ids),
+        "schedule_times": len(times),
+        "medicine_intake_logs": len(intakes),
+        "notifications": len(notifications),
+    }